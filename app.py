@@ -1,223 +1,21 @@
 import streamlit as st
-import folium
-from streamlit_folium import st_folium
-import requests
-import firebase_admin
-from firebase_admin import credentials, firestore
-from datetime import datetime
-from streamlit_geolocation import streamlit_geolocation
-from folium.plugins import MarkerCluster
-import json
-
-# --- Configurazione e Connessione al Database usando st.secrets ---
-try:
-    if not firebase_admin._apps:
-        firebase_creds_dict = {
-            "type": st.secrets["firebase_credentials"]["type"],
-            "project_id": st.secrets["firebase_credentials"]["project_id"],
-            "private_key_id": st.secrets["firebase_credentials"]["private_key_id"],
-            "private_key": st.secrets["firebase_credentials"]["private_key"].replace('\\n', '\n'),
-            "client_email": st.secrets["firebase_credentials"]["client_email"],
-            "client_id": st.secrets["firebase_credentials"]["client_id"],
-            "auth_uri": st.secrets["firebase_credentials"]["auth_uri"],
-            "token_uri": st.secrets["firebase_credentials"]["token_uri"],
-            "auth_provider_x509_cert_url": st.secrets["firebase_credentials"]["auth_provider_x509_cert_url"],
-            "client_x509_cert_url": st.secrets["firebase_credentials"]["client_x509_cert_url"],
-        }
-        if "universe_domain" in st.secrets["firebase_credentials"]:
-            firebase_creds_dict["universe_domain"] = st.secrets["firebase_credentials"]["universe_domain"]
-        cred = credentials.Certificate(firebase_creds_dict)
-        firebase_admin.initialize_app(cred)
-    db = firestore.client()
-except Exception as e:
-    st.error(f"⚠️ Errore di connessione a Firebase! Assicurati di aver impostato i Segreti correttamente. Dettagli: {e}")
-    st.stop()
+from autenticazione import (accedi_utente, accetta_privacy, elimina_utente, get_livello_utente, get_profilo_utente,
+                            invalida_profilo_utente, invia_email_verifica, registra_utente)
+from client_http import get_client
+from metriche import get_tempi_fasi, misura_fase
+from ricerca import (RITARDO_TOKEN_SECONDI, get_cache_ricerche, get_indice_stazioni, get_paginazioni_in_corso, posizione_valida,
+                     trova_distributori_google, unisci_pagine_arrivate)
 
+# Firebase, numpy e la mappa si importano più sotto, solo nelle sezioni che li usano:
+# titolo, accesso e ricerca si disegnano senza aspettarli
 st.set_page_config(layout="wide")
 st.title("⛽️ App Prezzi Carburante")
 
-# --- Funzioni di Autenticazione ---
-def registra_utente(email, password):
-    api_key = st.secrets["firebase_web_api_key"]
-    url = f"https://identitytoolkit.googleapis.com/v1/accounts:signUp?key={api_key}"
-    payload = {"email": email, "password": password, "returnSecureToken": True}
-    try:
-        response = requests.post(url, json=payload); response.raise_for_status()
-        user_data = response.json()
-        crea_profilo_utente(user_data['localId'], email)
-        return user_data
-    except requests.exceptions.HTTPError as err:
-        return {"error": err.response.json().get("error", {})}
-
-def accedi_utente(email, password):
-    api_key = st.secrets["firebase_web_api_key"]
-    url = f"https://identitytoolkit.googleapis.com/v1/accounts:signInWithPassword?key={api_key}"
-    payload = {"email": email, "password": password, "returnSecureToken": True}
-    try:
-        response = requests.post(url, json=payload); response.raise_for_status()
-        return response.json()
-    except requests.exceptions.HTTPError as err:
-        return {"error": err.response.json().get("error", {})}
-
-def invia_email_verifica(id_token):
-    api_key = st.secrets["firebase_web_api_key"]
-    url = f"https://identitytoolkit.googleapis.com/v1/accounts:sendOobCode?key={api_key}"
-    payload = {"requestType": "VERIFY_EMAIL", "idToken": id_token}
-    try:
-        requests.post(url, json=payload)
-    except requests.exceptions.HTTPError:
-        pass
-
-def elimina_utente(id_token):
-    api_key = st.secrets["firebase_web_api_key"]
-    url = f"https://identitytoolkit.googleapis.com/v1/accounts:delete?key={api_key}"
-    payload = {"idToken": id_token}
-    try:
-        response = requests.post(url, json=payload); response.raise_for_status()
-        return {"success": True}
-    except requests.exceptions.HTTPError as err:
-        error_message = err.response.json().get("error", {}).get("message", "ERRORE_SCONOSCIUTO")
-        return {"error": error_message}
-
-# MODIFICA 1: Aggiungiamo i campi per la gamification al profilo utente
-def crea_profilo_utente(uid, email):
-    db.collection("utenti").document(uid).set({
-        "email": email,
-        "data_registrazione": firestore.SERVER_TIMESTAMP,
-        "privacy_accepted": False,
-        "punti": 0,                   # <-- AGGIUNTO
-        "numero_segnalazioni": 0      # <-- AGGIUNTO
-    })
-
-def get_profilo_utente(uid):
-    doc_ref = db.collection("utenti").document(uid)
-    doc = doc_ref.get()
-    return doc.to_dict() if doc.exists else None
-
-def accetta_privacy(uid):
-    db.collection("utenti").document(uid).update({"privacy_accepted": True})
-
-# --- NUOVA FUNZIONE PER I LIVELLI UTENTE ---
-def get_livello_utente(punti):
-    """
-    Restituisce un titolo e un'icona in base ai punti dell'utente.
-    """
-    if punti < 50:
-        return "Novellino", "👶"
-    elif punti < 150:
-        return "Contributore Attivo", "👍"
-    elif punti < 500:
-        return "Esperto del Rifornimento", "😎"
-    elif punti < 1000:
-        return "Re della Strada", "👑"
-    else:
-        return "Leggenda del Carburante", "🏆"
-    
-# --- Funzioni di Logica ---
-@st.cache_data
-def trova_distributori_google(citta=None, coordinate=None):
-    api_key = st.secrets["google_api_key"]
-    if coordinate:
-        lat, lon = coordinate['latitude'], coordinate['longitude']
-        url = f"https://maps.googleapis.com/maps/api/place/nearbysearch/json?location={lat},{lon}&radius=5000&type=gas_station&key={api_key}&language=it"
-    elif citta:
-        query = f"distributori di benzina a {citta}"
-        url = f"https://maps.googleapis.com/maps/api/place/textsearch/json?query={query}&key={api_key}&language=it"
-    else: return []
-    try:
-        response = requests.get(url); response.raise_for_status()
-        risultati = response.json().get("results", [])
-        schedario = [{"id": luogo.get("place_id"), "nome": luogo.get("name", "N/D"), "indirizzo": luogo.get("vicinity", "N/D"), "latitudine": str(luogo["geometry"]["location"]["lat"]), "longitudine": str(luogo["geometry"]["location"]["lng"])} for luogo in risultati]
-        return schedario
-    except Exception as e:
-        st.error(f"Errore API Google: {e}"); return []
-
-def leggi_prezzi_da_firebase(lista_distributori):
-    prezzi_trovati = {}
-    ids = [d['id'] for d in lista_distributori if d.get('id')]
-    if not ids: return prezzi_trovati
-    docs = db.collection("prezzi_segnalati").where("id", "in", ids).stream()
-    for doc in docs:
-        prezzi_trovati[doc.id] = doc.to_dict()
-    return prezzi_trovati
-
-# MODIFICA 2: Assegniamo i punti quando si salva un prezzo
-def salva_prezzo(id_distributore, nome_distributore, tipo_carburante, nuovo_prezzo, user_id):
-    try:
-        # Codice esistente per salvare il prezzo
-        doc_ref = db.collection("prezzi_segnalati").document(id_distributore)
-        nuovo_prezzo_data = {
-            "valore": nuovo_prezzo, "conferme": 1,
-            "segnalato_da": [user_id], "data_inserimento": firestore.SERVER_TIMESTAMP
-        }
-        doc_ref.set({"id": id_distributore, "nome_distributore": nome_distributore, "prezzi": { tipo_carburante: nuovo_prezzo_data }, "ultimo_aggiornamento": firestore.SERVER_TIMESTAMP}, merge=True)
-
-        # --- AGGIUNTA: Aggiornamento punti e segnalazioni utente ---
-        utente_ref = db.collection("utenti").document(user_id)
-        utente_ref.update({
-            "punti": firestore.Increment(10),               # Aggiunge 10 punti
-            "numero_segnalazioni": firestore.Increment(1)   # Aumenta di 1 le segnalazioni
-        })
-        # --- FINE AGGIUNTA ---
-
-        st.success(f"Grazie! Prezzo per '{nome_distributore}' aggiornato."); st.cache_data.clear()
-    except Exception as e: st.error(f"Errore durante il salvataggio: {e}")
-
-# MODIFICA 3 (BONUS): Assegniamo punti anche per la conferma
-def conferma_prezzo(id_distributore, tipo_carburante, user_id):
-    try:
-        doc_ref = db.collection("prezzi_segnalati").document(id_distributore)
-        @firestore.transactional
-        def update_in_transaction(transaction, doc_ref):
-            snapshot = doc_ref.get(transaction=transaction)
-            dati = snapshot.to_dict()
-            if user_id not in dati["prezzi"][tipo_carburante]["segnalato_da"]:
-                transaction.update(doc_ref, {f"prezzi.{tipo_carburante}.conferme": firestore.Increment(1), f"prezzi.{tipo_carburante}.segnalato_da": firestore.ArrayUnion([user_id]), "ultimo_aggiornamento": firestore.SERVER_TIMESTAMP})
-                return True
-            else:
-                return False
-        
-        transaction = db.transaction()
-        result = update_in_transaction(transaction, doc_ref)
-        
-        if result:
-            # --- AGGIUNTA: Aggiornamento punti per la conferma ---
-            utente_ref = db.collection("utenti").document(user_id)
-            utente_ref.update({"punti": firestore.Increment(2)}) # Aggiunge 2 punti per la conferma
-            # --- FINE AGGIUNTA ---
-            st.success("Grazie per la tua conferma!")
-        else:
-            st.warning("Hai già confermato questo prezzo.")
-        st.cache_data.clear()
-    except Exception as e:
-        st.error(f"Errore durante la conferma: {e}")
-
-# --- Funzioni per la Mappa ---
-def crea_mappa_base(centro, zoom):
-    return folium.Map(location=centro, zoom_start=zoom, tiles="https://mt1.google.com/vt/lyrs=m&x={x}&y={y}&z={z}", attr="Google")
-
-def aggiungi_distributori_sulla_mappa(mappa_da_popolare, lista_distributori, prezzi_db, user_location=None):
-    marker_cluster = MarkerCluster().add_to(mappa_da_popolare)
-    for distributore in lista_distributori:
-        lat, lon = float(distributore["latitudine"]), float(distributore["longitudine"])
-        info_prezzi_db = prezzi_db.get(distributore.get('id'), {})
-        testo_prezzi = ""
-        if 'prezzi' in info_prezzi_db:
-            for carburante, info_carburante in info_prezzi_db['prezzi'].items():
-                prezzo_val = info_carburante.get('valore', 'N/D'); conferme_val = info_carburante.get('conferme', 0)
-                testo_prezzi += f"<br><b>{carburante}: {prezzo_val} €</b> ({conferme_val} conferme)"
-        popup_html = f"<strong>{distributore['nome']}</strong><br>{distributore['indirizzo']}{testo_prezzi}"
-        if user_location:
-            link_navigatore = f"https://www.google.com/maps/dir/?api=1&origin={user_location['latitude']},{user_location['longitude']}&destination={lat},{lon}"
-            popup_html += f"<br><br><a href='{link_navigatore}' target='_blank'>➡️ Avvia Navigatore</a>"
-        colore_icona = "green" if testo_prezzi else "blue"
-        icona = folium.Icon(color=colore_icona, icon="gas-pump", prefix="fa")
-        folium.Marker(location=[lat, lon], popup=popup_html, icon=icona).add_to(marker_cluster)
-
 # --- INIZIO APP ---
 if 'user_info' not in st.session_state: st.session_state.user_info = None
 if 'distributori_trovati' not in st.session_state: st.session_state.distributori_trovati = []
 if 'user_location' not in st.session_state: st.session_state.user_location = None
+st.session_state.letture_firestore_rerun = 0
 
 # --- Sezione Sidebar ---
 st.sidebar.header("👤 Area Utente")
@@ -279,7 +77,7 @@ else:
 
     if st.sidebar.button("Logout"):
         st.session_state.user_info = None
-        st.cache_data.clear()
+        invalida_profilo_utente()
         st.rerun()
     
     with st.sidebar.expander("⚠️ Gestione Account"):
@@ -289,6 +87,7 @@ else:
             risultato = elimina_utente(id_token)
             if risultato.get("success"):
                 st.session_state.user_info = None
+                invalida_profilo_utente()
                 st.success("Account eliminato.")
                 st.balloons()
                 st.rerun()
@@ -299,7 +98,7 @@ else:
 # --- Logica di Visualizzazione ---
 privacy_accettata = False
 if st.session_state.user_info:
-    profilo_utente_main = get_profilo_utente(st.session_state.user_info['localId']) # Riusiamo la funzione
+    profilo_utente_main = get_profilo_utente(st.session_state.user_info['localId']) # Già in sessione dalla sidebar
     if profilo_utente_main and profilo_utente_main.get("privacy_accepted", False):
         privacy_accettata = True
     else:
@@ -316,74 +115,137 @@ if privacy_accettata:
     with st.sidebar:
         st.markdown("---")
         st.header("📍 Trova Vicino a Me")
+        from streamlit_geolocation import streamlit_geolocation
         location_data = streamlit_geolocation()
         if st.button("Usa la Mia Posizione"):
-            if location_data:
+            if posizione_valida(location_data):
                 st.session_state.user_location = location_data
                 st.session_state.distributori_trovati = trova_distributori_google(coordinate=location_data)
             else: st.warning("Posizione non trovata.")
+        if posizione_valida(st.session_state.user_location):
+            with st.expander("💸 Il più economico vicino a te"):
+                # Il corpo di un expander gira anche da chiuso: la ricerca per area parte solo su richiesta
+                if st.toggle("Cerca nei dintorni", key="mostra_piu_economici"):
+                    carburante_area = st.selectbox("Carburante:", ["Benzina", "Gasolio", "GPL", "Metano"], key="carburante_area")
+                    raggio_area = st.slider("Raggio (km):", 1, 30, 10, key="raggio_area")
+                    from dati_prezzi import cerca_piu_economici
+                    piu_economici = cerca_piu_economici(st.session_state.user_location['latitude'], st.session_state.user_location['longitude'], raggio_area, carburante_area)
+                    for distanza, dati in piu_economici[:5]:
+                        st.write(f"**{dati['prezzi'][carburante_area]['valore']} €** — {dati.get('nome_distributore', 'N/D')} ({distanza / 1000:.1f} km)")
+                    if not piu_economici:
+                        st.caption("Nessun prezzo segnalato in questo raggio.")
     
     st.header("🌍 Cerca per Città")
     citta_cercata = st.text_input("Scrivi il nome di un comune:")
     if st.button("Cerca"):
         st.session_state.distributori_trovati = trova_distributori_google(citta=citta_cercata)
 
+    if unisci_pagine_arrivate():
+        if hasattr(st, "fragment"):
+            @st.fragment(run_every=RITARDO_TOKEN_SECONDI)
+            def attendi_altre_pagine():
+                chiave = st.session_state.get("chiave_ricerca_corrente")
+                stato = get_paginazioni_in_corso().get(chiave, {})
+                if stato.get("completa") or len(stato.get("schede", [])) != len(st.session_state.distributori_trovati):
+                    st.rerun()
+                st.caption("⏳ Caricamento di altri distributori...")
+            attendi_altre_pagine()
+        else:
+            st.caption("⏳ Altri distributori in arrivo: verranno mostrati al prossimo aggiornamento.")
+
     if st.session_state.distributori_trovati:
+        # La parte di ricerca è già disegnata e ci sono risultati: solo ora si caricano Firestore e numpy
+        from dati_prezzi import (GIORNI_TENDENZA, INTERVALLO_AGGIORNAMENTI_SECONDI, citta_segnalazione, conferma_prezzo, get_gestore_ascolti,
+                                 get_id_sessione, get_tabella_prezzi, leggi_prezzi_da_firebase, leggi_storico, salva_prezzi, tendenza_prezzo)
+        from storico_prezzi import statistiche_area
         distributori = st.session_state.distributori_trovati
         prezzi_community = leggi_prezzi_da_firebase(distributori)
         st.markdown("---"); st.header("⛽ Risultati della Ricerca")
         
-        tipi_carburante_trovati = list(set(carb for id, p_info in prezzi_community.items() for carb in p_info.get('prezzi', {}).keys()))
-        carburante_selezionato = st.selectbox("Filtra per tipo di carburante:", ["-"] + sorted(tipi_carburante_trovati))
+        if hasattr(st, "fragment"):
+            @st.fragment(run_every=INTERVALLO_AGGIORNAMENTI_SECONDI)
+            def ascolta_aggiornamenti(ids):
+                # Tiene viva l'iscrizione e riesegue la pagina quando arriva un prezzo nuovo
+                gestore = get_gestore_ascolti()
+                gestore.iscrivi(get_id_sessione(), ids)
+                numero, istante = gestore.versione(ids)
+                if numero > st.session_state.get("versione_prezzi_vista", 0):
+                    gestore.registra_consegna(istante)
+                    st.rerun()
+            ascolta_aggiornamenti([d['id'] for d in distributori if d.get('id')])
+
+        with misura_fase("tabella_prezzi"):
+            tabella = get_tabella_prezzi(distributori, prezzi_community)
+        carburante_selezionato = st.selectbox("Filtra per tipo di carburante:", ["-"] + tabella.carburanti)
         
         risultati_finali = distributori
         con_prezzo = []
         if carburante_selezionato != "-":
-            con_prezzo = [d for d in distributori if d['id'] in prezzi_community and carburante_selezionato in prezzi_community[d['id']].get('prezzi', {})]
+            ordinamento = "Prezzo"
+            if posizione_valida(st.session_state.user_location):
+                ordinamento = st.radio("Ordina per:", ["Prezzo", "Convenienza (prezzo + distanza)"], horizontal=True)
+            with misura_fase("tabella_prezzi"):
+                if ordinamento == "Prezzo" or not posizione_valida(st.session_state.user_location):
+                    righe = tabella.ordina_per_prezzo(carburante_selezionato)
+                else:
+                    righe = tabella.ordina_per_convenienza(carburante_selezionato, st.session_state.user_location['latitude'], st.session_state.user_location['longitude'])
+            con_prezzo = [distributori[i] for i in righe]
             if con_prezzo:
-                risultati_finali = sorted(con_prezzo, key=lambda d: float(prezzi_community[d['id']]['prezzi'][carburante_selezionato]['valore']))
+                risultati_finali = con_prezzo
         
         st.success(f"Trovati {len(distributori)} distributori. Visualizzo {len(risultati_finali)} risultati filtrati.")
 
+        storico_risultati = {}
+        if carburante_selezionato != "-" and con_prezzo:
+            storico_risultati = leggi_storico([d['id'] for d in risultati_finali], carburante_selezionato)
+
         if risultati_finali:
             if carburante_selezionato != "-" and con_prezzo:
-                lista_prezzi = [float(prezzi_community[d['id']]['prezzi'][carburante_selezionato]['valore']) for d in risultati_finali]
-                if lista_prezzi:
+                with misura_fase("statistiche"):
+                    statistiche = tabella.statistiche(carburante_selezionato)
+                    storico_zona = statistiche_area(storico_risultati)
+                if statistiche:
                     st.subheader(f"📈 Statistiche per '{carburante_selezionato}' in zona")
-                    col1, col2, col3 = st.columns(3)
-                    col1.metric("Prezzo Minimo", f"{min(lista_prezzi):.3f} €"); col2.metric("Prezzo Massimo", f"{max(lista_prezzi):.3f} €"); col3.metric("Prezzo Medio", f"{sum(lista_prezzi) / len(lista_prezzi):.3f} €")
+                    col1, col2, col3, col4 = st.columns(4)
+                    col1.metric("Prezzo Minimo", f"{statistiche['minimo']:.3f} €"); col2.metric("Prezzo Massimo", f"{statistiche['massimo']:.3f} €"); col3.metric("Prezzo Medio", f"{statistiche['media']:.3f} €"); col4.metric("Prezzo Mediano", f"{statistiche['mediana']:.3f} €")
+                    st.caption(f"Metà dei distributori è tra {statistiche['p25']:.3f} € e {statistiche['p75']:.3f} €.")
+                    if storico_zona:
+                        st.caption(f"Ultimi {GIORNI_TENDENZA} giorni in zona: minimo {storico_zona['minimo']:.3f} €, massimo {storico_zona['massimo']:.3f} €, media {storico_zona['media']:.3f} € su {storico_zona['campioni']} segnalazioni")
             
-            tab_lista, tab_mappa = st.tabs(["🏆 Lista Risultati", "🗺️ Mappa"])
+            # Con st.tabs la mappa si costruirebbe a ogni rerun anche senza guardarla
+            vista = st.radio("Vista:", ["🏆 Lista Risultati", "🗺️ Mappa"], horizontal=True, label_visibility="collapsed", key="vista_risultati")
 
-            with tab_lista:
+            if vista == "🏆 Lista Risultati":
                 st.subheader("Lista dei distributori")
                 for d in risultati_finali:
                     with st.container():
                         col_info, col_prezzo = st.columns([2, 1])
                         with col_info:
                             st.markdown(f"**{d['nome']}**<br><small>{d['indirizzo']}</small>", unsafe_allow_html=True)
-                            if st.session_state.user_location:
+                            if posizione_valida(st.session_state.user_location):
                                 link_navigatore = f"https://www.google.com/maps/dir/?api=1&origin={st.session_state.user_location['latitude']},{st.session_state.user_location['longitude']}&destination={d['latitudine']},{d['longitudine']}"
                                 st.markdown(f"<a href='{link_navigatore}' target='_blank'>➡️ Avvia Navigatore</a>", unsafe_allow_html=True)
                         with col_prezzo:
                             prezzo_info_dict = prezzi_community.get(d['id'], {}).get('prezzi', {})
                             if carburante_selezionato != "-" and carburante_selezionato in prezzo_info_dict:
                                 info_prezzo = prezzo_info_dict[carburante_selezionato]
-                                st.metric(label=carburante_selezionato, value=f"{info_prezzo['valore']} €")
+                                differenza = tendenza_prezzo(storico_risultati.get(d['id']), info_prezzo['valore'])
+                                st.metric(label=carburante_selezionato, value=f"{info_prezzo['valore']} €",
+                                          delta=f"{differenza:+.3f} € sulla media {GIORNI_TENDENZA} gg" if differenza is not None else None,
+                                          delta_color="inverse")
                                 conferme = info_prezzo.get("conferme", 1)
                                 st.write(f"✅ {conferme} Conferme")
                                 if st.session_state.user_info:
                                     user_id = st.session_state.user_info['localId']
                                     if user_id not in info_prezzo.get("segnalato_da", []):
                                         if st.button("👍 Conferma", key=f"conf_{d['id']}"):
-                                            conferma_prezzo(d['id'], carburante_selezionato, user_id)
+                                            conferma_prezzo(d['id'], carburante_selezionato, user_id, citta=citta_segnalazione(d))
                     st.markdown("---")
             
-            with tab_mappa:
-                if risultati_finali:
-                    mappa_citta = crea_mappa_base(centro=[float(risultati_finali[0]['latitudine']), float(risultati_finali[0]['longitudine'])], zoom=12)
-                    aggiungi_distributori_sulla_mappa(mappa_citta, risultati_finali, prezzi_community, user_location=st.session_state.user_location)
-                    st_folium(mappa_citta, width="100%", height=500, returned_objects=[])
+            else:
+                # folium e streamlit_folium si caricano la prima volta che qualcuno apre la mappa
+                from vista_mappa import mostra_mappa
+                mostra_mappa(risultati_finali, prezzi_community, st.session_state.user_location if posizione_valida(st.session_state.user_location) else None)
 
         elif carburante_selezionato != "-":
                  st.info(f"Nessun prezzo segnalato per '{carburante_selezionato}' in questa zona.")
@@ -397,13 +259,60 @@ if privacy_accettata:
             distributore_selezionato_obj = [d for d in distributori_per_form if d['nome'] == distributore_selezionato_nome][0]
             id_selezionato = distributore_selezionato_obj['id']
             user_id = st.session_state.user_info['localId']
-            col1, col2 = st.columns(2)
-            with col1:
-                carburante_da_segnalare = st.selectbox("3. Seleziona il carburante:", ["Benzina", "Gasolio", "GPL", "Metano"])
-            with col2:
-                prezzo_inserito = st.number_input("4. Inserisci il prezzo:", format="%.3f", step=0.001, min_value=0.0)
+            carburanti_da_segnalare = st.multiselect("3. Seleziona i carburanti:", ["Benzina", "Gasolio", "GPL", "Metano"], default=["Benzina"])
+            prezzi_inseriti = {}
+            if carburanti_da_segnalare:
+                colonne = st.columns(len(carburanti_da_segnalare))
+                for colonna, carburante in zip(colonne, carburanti_da_segnalare):
+                    with colonna:
+                        prezzi_inseriti[carburante] = st.number_input(f"4. Prezzo {carburante}:", format="%.3f", step=0.001, min_value=0.0, max_value=10.0, key=f"prezzo_{carburante}")
             if st.button("Invia Segnalazione"):
-                if prezzo_inserito > 0:
-                    salva_prezzo(id_selezionato, distributore_selezionato_nome, carburante_da_segnalare, prezzo_inserito, user_id)
+                prezzi_validi = {carburante: prezzo for carburante, prezzo in prezzi_inseriti.items() if prezzo > 0}
+                if prezzi_validi:
+                    salva_prezzi(id_selezionato, distributore_selezionato_nome, prezzi_validi, user_id, citta=citta_segnalazione(distributore_selezionato_obj),
+                                 posizione=(float(distributore_selezionato_obj['latitudine']), float(distributore_selezionato_obj['longitudine'])))
     elif st.session_state.distributori_trovati and not st.session_state.user_info:
-        st.info("💡 Accedi o registrati per poter segnalare e confermare i prezzi!")
\ No newline at end of file
+        st.info("💡 Accedi o registrati per poter segnalare e confermare i prezzi!")
+
+# --- Classifica ---
+# Per chi non ha fatto l'accesso si legge solo su richiesta: la pagina anonima non apre Firestore
+with st.sidebar.expander("🏅 Classifica"):
+    if st.session_state.user_info or st.toggle("Mostra la classifica", key="mostra_classifica"):
+        from dati_prezzi import citta_ricerca_corrente, errore_materializzazione, get_classifica
+        citta_classifica = citta_ricerca_corrente()
+        scelta_classifica = st.radio("Classifica:", ["Generale"] + ([citta_classifica] if citta_classifica else []), horizontal=True)
+        classifica = get_classifica(None if scelta_classifica == "Generale" else scelta_classifica)
+        if classifica.get("voci"):
+            for posizione, voce in enumerate(classifica["voci"], start=1):
+                st.write(f"{posizione}. {voce['nome']} — {voce['punti']} punti")
+        else:
+            st.caption("Classifica non ancora disponibile.")
+        if errore_materializzazione():
+            st.caption(f"⚠️ Aggiornamento della classifica non riuscito: {errore_materializzazione()}")
+
+# --- Diagnostica delle cache ---
+with st.sidebar.expander("🔧 Diagnostica"):
+    if st.toggle("Mostra la diagnostica", key="mostra_diagnostica"):
+        from dati_prezzi import gestore_ascolti_avviato, get_cache_classifiche, get_cache_prezzi
+        st.caption(f"Letture Firestore: {st.session_state.letture_firestore_rerun} in questo rerun, {st.session_state.get('letture_firestore_sessione', 0)} nella sessione")
+        st.caption("Cache ricerche Google")
+        st.json(get_cache_ricerche().riepilogo(), expanded=False)
+        st.caption("Cache prezzi")
+        st.json(get_cache_prezzi().riepilogo(), expanded=False)
+        st.caption(f"Indice locale: {get_indice_stazioni().conta_stazioni()} distributori")
+        if "statistiche_mappa" in st.session_state:
+            st.caption("Ultima costruzione della mappa")
+            st.json(st.session_state.statistiche_mappa, expanded=False)
+        st.caption("Aggiornamenti in tempo reale")
+        # Solo se una ricerca ha già avviato gli ascolti: la diagnostica non apre connessioni
+        gestore_ascolti = gestore_ascolti_avviato()
+        if gestore_ascolti:
+            st.json(gestore_ascolti.metriche(), expanded=False)
+        else:
+            st.caption("Nessun ascolto avviato.")
+        st.caption("Cache classifiche")
+        st.json(get_cache_classifiche().riepilogo(), expanded=False)
+        st.caption("Chiamate HTTP (latenze in ms)")
+        st.json(get_client().statistiche(), expanded=False)
+        st.caption("Tempi per fase (processo)")
+        st.json(get_tempi_fasi().riepilogo(), expanded=False)
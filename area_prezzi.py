@@ -0,0 +1,80 @@
+"""
+Ricerca dei prezzi per area su prezzi_segnalati, senza conoscere prima gli ID.
+
+Ogni documento porta il geohash (precisione 9) del distributore: un prefisso di
+geohash è un intervallo lessicografico, quindi un cerchio si copre con poche
+query di intervallo sullo stesso campo, a qualunque precisione. Le celle
+contigue nell'ordine del geohash si fondono in un solo intervallo; i risultati
+si filtrano poi per distanza esatta.
+"""
+from indice_stazioni import BASE32_GEOHASH, celle_per_raggio, distanza_m, geohash_codifica
+
+PRECISIONE_DOCUMENTI = 9
+PRECISIONE_MASSIMA_COPERTURA = 6
+# Limite sulle query di intervallo, cioè sulle celle dopo la fusione
+MAX_INTERVALLI_COPERTURA = 32
+
+
+def campi_geohash(lat, lon):
+    """Campi da salvare sul documento dei prezzi."""
+    return {"geohash": geohash_codifica(lat, lon, PRECISIONE_DOCUMENTI), "latitudine": float(lat), "longitudine": float(lon)}
+
+
+def _valore_cella(cella):
+    valore = 0
+    for carattere in cella:
+        valore = valore * 32 + BASE32_GEOHASH.index(carattere)
+    return valore
+
+
+def copertura(lat, lon, raggio_m):
+    """Celle della precisione più fine che copre il cerchio con al massimo MAX_INTERVALLI_COPERTURA query."""
+    for precisione in range(PRECISIONE_MASSIMA_COPERTURA, 0, -1):
+        celle = celle_per_raggio(lat, lon, raggio_m, precisione)
+        if len(intervalli_geohash(celle)) <= MAX_INTERVALLI_COPERTURA:
+            return celle
+    return celle
+
+
+def intervalli_geohash(celle):
+    """Fonde le celle consecutive in intervalli [inizio, fine) sul campo geohash."""
+    intervalli = []
+    for cella in sorted(celle, key=_valore_cella):
+        if intervalli and _valore_cella(cella) == _valore_cella(intervalli[-1][1]) + 1:
+            intervalli[-1][1] = cella
+        else:
+            intervalli.append([cella, cella])
+    # "~" viene dopo tutti i caratteri del base32, quindi chiude ogni geohash con quel prefisso
+    return [(inizio, fine + "~") for inizio, fine in intervalli]
+
+
+def _leggi_intervallo(db, intervallo):
+    inizio, fine = intervallo
+    query = db.collection("prezzi_segnalati").where("geohash", ">=", inizio).where("geohash", "<", fine)
+    return [doc.to_dict() for doc in query.stream()]
+
+
+def cerca_prezzi_in_area(db, lat, lon, raggio_m, tipo_carburante=None, pool=None, conta_letture=None):
+    """
+    Documenti dei prezzi entro raggio_m, come lista di (distanza_m, dati).
+    Con tipo_carburante restano solo i distributori con quel prezzo, dal più economico.
+    conta_letture, se c'è, riceve i documenti letti da ogni query (nel thread chiamante).
+    """
+    intervalli = intervalli_geohash(copertura(lat, lon, raggio_m))
+    mappa = pool.map if pool is not None else map
+    trovati = []
+    for documenti in mappa(lambda intervallo: _leggi_intervallo(db, intervallo), intervalli):
+        if conta_letture is not None:
+            # Firestore addebita una lettura anche alle query senza risultati
+            conta_letture(max(len(documenti), 1))
+        for dati in documenti:
+            if "latitudine" not in dati: continue
+            distanza = distanza_m(lat, lon, dati["latitudine"], dati["longitudine"])
+            if distanza > raggio_m: continue
+            if tipo_carburante and tipo_carburante not in dati.get("prezzi", {}): continue
+            trovati.append((distanza, dati))
+    if tipo_carburante:
+        trovati.sort(key=lambda t: float(t[1]["prezzi"][tipo_carburante]["valore"]))
+    else:
+        trovati.sort(key=lambda t: t[0])
+    return trovati
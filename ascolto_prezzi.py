@@ -0,0 +1,177 @@
+"""
+Ascolti on_snapshot condivisi da tutte le sessioni su prezzi_segnalati.
+
+Gli ID dei distributori sono divisi in blocchi da 30 (il limite di "in"); ogni
+blocco ha un solo listener per processo, con il conteggio delle sessioni che lo
+usano. Gli aggiornamenti finiscono in uno specchio in memoria da cui le sessioni
+leggono senza interrogare Firestore; i blocchi non più toccati da nessuna
+sessione vengono chiusi. Un listener caduto (errore o stream chiuso dal server)
+viene riaperto alla lettura successiva, che intanto torna a Firestore.
+"""
+import threading
+import time
+from collections import deque
+
+DIMENSIONE_BLOCCO = 30
+INATTIVITA_SECONDI = 120
+CAMPIONI_LATENZA = 500
+
+
+def _percentile(valori, quantile):
+    if not valori: return None
+    ordinati = sorted(valori)
+    return round(ordinati[min(int(len(ordinati) * quantile), len(ordinati) - 1)], 1)
+
+
+class GestoreAscolti:
+    def __init__(self, db, inattivita_secondi=INATTIVITA_SECONDI):
+        self._db = db
+        self.inattivita_secondi = inattivita_secondi
+        self._lock = threading.Lock()
+        # blocco (tupla di ID) -> {"watch", "sessioni": {id_sessione: ultimo tocco}, "pronto": bool}
+        self._blocchi = {}
+        # id_sessione -> insieme dei blocchi che usa
+        self._sessioni = {}
+        # ID distributore -> dati del documento ({} se non ha prezzi)
+        self._specchio = {}
+        # ID distributore -> (numero di modifica, istante della modifica)
+        self._modifiche = {}
+        self._contatore_modifiche = 0
+        self._letture_risparmiate = 0
+        # Documenti consegnati dagli ascolti: Firestore li addebita come letture del processo, non di una sessione
+        self._letture_ascolti = 0
+        self._ascolti_riaperti = 0
+        self._aggiornamenti_ricevuti = 0
+        self._ritardi_snapshot_ms = deque(maxlen=CAMPIONI_LATENZA)
+        self._ritardi_consegna_ms = deque(maxlen=CAMPIONI_LATENZA)
+
+    @staticmethod
+    def blocchi_per(ids):
+        ordinati = sorted(set(ids))
+        return [tuple(ordinati[i:i + DIMENSIONE_BLOCCO]) for i in range(0, len(ordinati), DIMENSIONE_BLOCCO)]
+
+    # --- Iscrizioni ---
+    def iscrivi(self, id_sessione, ids):
+        """Collega la sessione ai blocchi di questi ID e la scollega da quelli che non mostra più."""
+        blocchi = set(self.blocchi_per(ids))
+        adesso = time.monotonic()
+        da_aprire = []
+        with self._lock:
+            for blocco in self._sessioni.get(id_sessione, set()) - blocchi:
+                self._blocchi[blocco]["sessioni"].pop(id_sessione, None)
+            for blocco in blocchi:
+                stato = self._blocchi.get(blocco)
+                if stato is None:
+                    stato = self._blocchi[blocco] = {"watch": None, "sessioni": {}, "pronto": False}
+                    da_aprire.append(blocco)
+                stato["sessioni"][id_sessione] = adesso
+            self._sessioni[id_sessione] = blocchi
+        for blocco in da_aprire:
+            self._apri(blocco)
+        self.pulisci()
+
+    def _apri(self, blocco):
+        query = self._db.collection("prezzi_segnalati").where("id", "in", list(blocco))
+        watch = query.on_snapshot(lambda documenti, modifiche, letto_il: self._su_snapshot(blocco, documenti, modifiche, letto_il))
+        with self._lock:
+            stato = self._blocchi.get(blocco)
+            if stato is not None and stato["watch"] is None:
+                stato["watch"] = watch
+                return
+        # Il blocco è stato chiuso mentre si apriva, o un'altra riapertura è arrivata prima
+        watch.unsubscribe()
+
+    def _su_snapshot(self, blocco, documenti, modifiche, letto_il):
+        adesso = time.time()
+        with self._lock:
+            stato = self._blocchi.get(blocco)
+            if stato is None: return
+            # Una query senza risultati costa comunque una lettura
+            self._letture_ascolti += max(len(documenti), 1) if not stato["pronto"] else len(modifiche)
+            if not stato["pronto"]:
+                # Prima istantanea: i distributori senza documento non hanno prezzi
+                presenti = {doc.id: doc.to_dict() for doc in documenti}
+                for id_distributore in blocco:
+                    self._specchio[id_distributore] = presenti.get(id_distributore, {})
+                stato["pronto"] = True
+                return
+            for modifica in modifiche:
+                documento = modifica.document
+                self._specchio[documento.id] = {} if modifica.type.name == "REMOVED" else documento.to_dict()
+                self._contatore_modifiche += 1
+                self._modifiche[documento.id] = (self._contatore_modifiche, adesso)
+                self._aggiornamenti_ricevuti += 1
+            if modifiche and hasattr(letto_il, "timestamp"):
+                self._ritardi_snapshot_ms.append(max(0.0, (adesso - letto_il.timestamp()) * 1000))
+
+    def pulisci(self):
+        """Chiude i blocchi che nessuna sessione ha toccato negli ultimi inattivita_secondi."""
+        limite = time.monotonic() - self.inattivita_secondi
+        da_chiudere = []
+        with self._lock:
+            for blocco, stato in list(self._blocchi.items()):
+                for id_sessione in [s for s, tocco in stato["sessioni"].items() if tocco < limite]:
+                    del stato["sessioni"][id_sessione]
+                if not stato["sessioni"]:
+                    da_chiudere.append(self._blocchi.pop(blocco))
+            if da_chiudere:
+                # Lo stesso distributore può stare in blocchi di ricerche diverse
+                ancora_ascoltati = {i for blocco in self._blocchi for i in blocco}
+                for id_distributore in self._specchio.keys() - ancora_ascoltati:
+                    del self._specchio[id_distributore]
+                    self._modifiche.pop(id_distributore, None)
+            for id_sessione, blocchi in list(self._sessioni.items()):
+                ancora_aperti = {b for b in blocchi if id_sessione in self._blocchi.get(b, {}).get("sessioni", {})}
+                if ancora_aperti: self._sessioni[id_sessione] = ancora_aperti
+                else: del self._sessioni[id_sessione]
+        for stato in da_chiudere:
+            if stato["watch"] is not None:
+                stato["watch"].unsubscribe()
+
+    # --- Letture dalle sessioni ---
+    def leggi(self, ids, gia_in_cache=frozenset()):
+        """
+        Dati dallo specchio se tutti i blocchi sono pronti e il loro listener è vivo,
+        altrimenti None. Gli ID in gia_in_cache sarebbero arrivati comunque dalla
+        cache dei prezzi: non contano tra le letture risparmiate.
+        """
+        blocchi = self.blocchi_per(ids)
+        da_riaprire, dati = [], None
+        with self._lock:
+            for blocco in blocchi:
+                stato = self._blocchi.get(blocco)
+                if stato is not None and stato["watch"] is not None and not stato["watch"].is_active:
+                    # Lo specchio di questo blocco non riceve più modifiche: non è più affidabile
+                    stato["watch"], stato["pronto"] = None, False
+                    da_riaprire.append(blocco)
+                    self._ascolti_riaperti += 1
+            if all(self._blocchi.get(b, {}).get("pronto") for b in blocchi):
+                self._letture_risparmiate += sum(1 for i in ids if i not in gia_in_cache)
+                dati = {id_distributore: self._specchio.get(id_distributore, {}) for id_distributore in ids}
+        for blocco in da_riaprire:
+            self._apri(blocco)
+        return dati
+
+    def versione(self, ids):
+        """Numero dell'ultima modifica ricevuta per questi ID e l'istante in cui è arrivata."""
+        with self._lock:
+            return max((self._modifiche.get(i, (0, 0.0)) for i in ids), default=(0, 0.0))
+
+    def registra_consegna(self, istante_modifica):
+        with self._lock:
+            self._ritardi_consegna_ms.append(max(0.0, (time.time() - istante_modifica) * 1000))
+
+    def metriche(self):
+        with self._lock:
+            return {
+                "ascolti_attivi": len(self._blocchi),
+                "sessioni": len(self._sessioni),
+                "distributori_in_memoria": len(self._specchio),
+                "aggiornamenti_ricevuti": self._aggiornamenti_ricevuti,
+                "letture_firestore_risparmiate": self._letture_risparmiate,
+                "letture_firestore_ascolti": self._letture_ascolti,
+                "ascolti_riaperti": self._ascolti_riaperti,
+                "ritardo_snapshot_p50_ms": _percentile(self._ritardi_snapshot_ms, 0.5),
+                "ritardo_consegna_p50_ms": _percentile(self._ritardi_consegna_ms, 0.5),
+                "ritardo_consegna_p99_ms": _percentile(self._ritardi_consegna_ms, 0.99),
+            }
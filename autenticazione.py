@@ -0,0 +1,121 @@
+"""
+Accesso con Identity Toolkit e profilo dell'utente su Firestore.
+
+Le chiamate all'API passano dal client HTTP condiviso; il profilo resta in
+session_state e si rilegge solo dopo le operazioni che lo modificano.
+"""
+import requests
+import streamlit as st
+
+from client_http import get_client
+from connessione import conta_letture_firestore, get_db
+from metriche import misura_fase
+
+# --- Funzioni di Autenticazione ---
+def _url_identity(metodo):
+    # Configurabile dai segreti per puntare a uno stub locale dell'API
+    api_key = st.secrets["firebase_web_api_key"]
+    return f"{st.secrets.get('identity_toolkit_url', 'https://identitytoolkit.googleapis.com/v1')}/accounts:{metodo}?key={api_key}"
+
+def registra_utente(email, password):
+    url = _url_identity("signUp")
+    payload = {"email": email, "password": password, "returnSecureToken": True}
+    try:
+        response = get_client().post("identity_signup", url, json=payload); response.raise_for_status()
+        user_data = response.json()
+        crea_profilo_utente(user_data['localId'], email)
+        return user_data
+    except requests.exceptions.HTTPError as err:
+        return {"error": err.response.json().get("error", {})}
+    except requests.exceptions.RequestException:
+        return {"error": {"message": "SERVIZIO_NON_RAGGIUNGIBILE"}}
+
+def accedi_utente(email, password):
+    url = _url_identity("signInWithPassword")
+    payload = {"email": email, "password": password, "returnSecureToken": True}
+    try:
+        response = get_client().post("identity_signin", url, json=payload); response.raise_for_status()
+        return response.json()
+    except requests.exceptions.HTTPError as err:
+        return {"error": err.response.json().get("error", {})}
+    except requests.exceptions.RequestException:
+        return {"error": {"message": "SERVIZIO_NON_RAGGIUNGIBILE"}}
+
+def invia_email_verifica(id_token):
+    url = _url_identity("sendOobCode")
+    payload = {"requestType": "VERIFY_EMAIL", "idToken": id_token}
+    try:
+        get_client().post("identity_oob", url, json=payload)
+    except requests.exceptions.RequestException:
+        pass
+
+def elimina_utente(id_token):
+    url = _url_identity("delete")
+    payload = {"idToken": id_token}
+    try:
+        response = get_client().post("identity_delete", url, json=payload); response.raise_for_status()
+        return {"success": True}
+    except requests.exceptions.HTTPError as err:
+        error_message = err.response.json().get("error", {}).get("message", "ERRORE_SCONOSCIUTO")
+        return {"error": error_message}
+    except requests.exceptions.RequestException:
+        return {"error": "SERVIZIO_NON_RAGGIUNGIBILE"}
+
+# MODIFICA 1: Aggiungiamo i campi per la gamification al profilo utente
+def crea_profilo_utente(uid, email):
+    from firebase_admin import firestore
+    with misura_fase("attesa_firestore"):
+        get_db().collection("utenti").document(uid).set({
+            "email": email,
+            "data_registrazione": firestore.SERVER_TIMESTAMP,
+            "privacy_accepted": False,
+            "punti": 0,                   # <-- AGGIUNTO
+            "numero_segnalazioni": 0      # <-- AGGIUNTO
+        })
+
+def get_profilo_utente(uid, aggiorna=False):
+    # Il profilo resta in sessione e si rilegge solo dopo le operazioni che lo modificano
+    if not aggiorna and st.session_state.get("profilo_uid") == uid and "profilo_utente" in st.session_state:
+        return st.session_state.profilo_utente
+    # Importato qui: serve solo a chi ha fatto l'accesso
+    from classifica import totali_utente
+    db = get_db()
+    doc_ref = db.collection("utenti").document(uid)
+    with misura_fase("attesa_firestore"):
+        doc = doc_ref.get()
+        profilo = doc.to_dict() if doc.exists else None
+        conta_letture_firestore(1)
+        if profilo:
+            # I punti nuovi stanno sugli shard dei contatori (vedi classifica.py)
+            punti, segnalazioni, _, shard_letti = totali_utente(db, uid, profilo)
+            # Una query senza risultati costa comunque una lettura
+            conta_letture_firestore(max(shard_letti, 1))
+            profilo = {**profilo, "punti": punti, "numero_segnalazioni": segnalazioni}
+    st.session_state.profilo_utente = profilo
+    st.session_state.profilo_uid = uid
+    return profilo
+
+def invalida_profilo_utente():
+    st.session_state.pop("profilo_utente", None)
+    st.session_state.pop("profilo_uid", None)
+
+def accetta_privacy(uid):
+    with misura_fase("attesa_firestore"):
+        get_db().collection("utenti").document(uid).update({"privacy_accepted": True})
+    invalida_profilo_utente()
+
+# --- NUOVA FUNZIONE PER I LIVELLI UTENTE ---
+def get_livello_utente(punti):
+    """
+    Restituisce un titolo e un'icona in base ai punti dell'utente.
+    """
+    if punti < 50:
+        return "Novellino", "👶"
+    elif punti < 150:
+        return "Contributore Attivo", "👍"
+    elif punti < 500:
+        return "Esperto del Rifornimento", "😎"
+    elif punti < 1000:
+        return "Re della Strada", "👑"
+    else:
+        return "Leggenda del Carburante", "🏆"
@@ -0,0 +1,115 @@
+"""
+Avvio a freddo di app.py: tempo di importazione delle dipendenze pesanti e tempo
+al primo disegno per un utente anonimo, ogni misura in un processo nuovo.
+
+Le importazioni restano in sys.modules per tutta la vita del processo, quindi
+pesano sull'avvio del server (e su ogni risveglio dell'app) e non sui rerun.
+Il primo disegno è l'istante in cui lo script arriva alla casella di ricerca:
+titolo, accesso e ricerca sono già stati inviati al browser. Per ogni misura si
+stampano anche i moduli pesanti caricati fino a quel momento.
+
+La pagina anonima non legge Firestore (classifica e diagnostica si aprono su
+richiesta), quindi non serve l'emulatore. Se a fine esecuzione risultano caricati
+firebase_admin o numpy il benchmark termina con errore.
+
+    python benchmark/avvio_app.py [--ripetizioni 5]
+"""
+import argparse
+import importlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+RADICE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PERCORSO_APP = os.path.join(RADICE, "app.py")
+MODULI_PESANTI = ["firebase_admin", "google.cloud.firestore", "numpy", "folium", "streamlit_folium", "streamlit_geolocation"]
+MODULI_APP = ["autenticazione", "ricerca", "dati_prezzi", "vista_mappa"]
+MODULI_VIETATI_ANONIMO = ["firebase_admin", "numpy"]
+ETICHETTA_RICERCA = "Scrivi il nome di un comune:"
+
+
+def _caricati():
+    return [m for m in MODULI_PESANTI if m in sys.modules]
+
+
+def figlio_importazione(modulo):
+    # Streamlit è già caricato quando il server esegue lo script
+    import streamlit  # noqa: F401
+    sys.path.insert(0, RADICE)
+    inizio = time.perf_counter()
+    importlib.import_module(modulo)
+    print(json.dumps({"ms": (time.perf_counter() - inizio) * 1000}))
+
+
+def figlio_primo_disegno():
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+    sys.path.insert(0, RADICE)
+    misure, inizio = {}, [0.0]
+    text_input = st.text_input
+
+    def text_input_misurato(etichetta, *args, **kwargs):
+        if etichetta == ETICHETTA_RICERCA and "primo_disegno_ms" not in misure:
+            misure["primo_disegno_ms"] = (time.perf_counter() - inizio[0]) * 1000
+            misure["moduli_al_primo_disegno"] = _caricati()
+        return text_input(etichetta, *args, **kwargs)
+
+    st.text_input = text_input_misurato
+    for chiave in ("prima_sessione_ms", "seconda_sessione_ms"):
+        sessione = AppTest.from_file(PERCORSO_APP, default_timeout=120)
+        sessione.secrets.update({"google_api_key": "stub", "firebase_web_api_key": "stub"})
+        inizio[0] = time.perf_counter()
+        sessione.run()
+        misure[chiave] = (time.perf_counter() - inizio[0]) * 1000
+        if sessione.exception:
+            misure["errore"] = sessione.exception[0].message
+        misure.setdefault("moduli_a_fine_esecuzione", _caricati())
+    print(json.dumps(misure))
+
+
+def in_processo_nuovo(argomenti, cartella):
+    uscita = subprocess.run([sys.executable, os.path.abspath(__file__), *argomenti], cwd=cartella,
+                            capture_output=True, text=True, check=True)
+    return json.loads(uscita.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ripetizioni", type=int, default=5)
+    parser.add_argument("--figlio-importazione", help=argparse.SUPPRESS)
+    parser.add_argument("--figlio-disegno", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.figlio_importazione:
+        return figlio_importazione(args.figlio_importazione)
+    if args.figlio_disegno:
+        return figlio_primo_disegno()
+
+    with tempfile.TemporaryDirectory() as cartella:
+        print(f"{'importazione (ms)':<26} {'p50':>8} {'max':>8}")
+        for modulo in MODULI_PESANTI + MODULI_APP:
+            tempi = [in_processo_nuovo(["--figlio-importazione", modulo], cartella)["ms"] for _ in range(args.ripetizioni)]
+            print(f"{modulo:<26} {statistics.median(tempi):>8.1f} {max(tempi):>8.1f}")
+
+        esecuzioni = [in_processo_nuovo(["--figlio-disegno"], cartella) for _ in range(args.ripetizioni)]
+        print(f"\n{'app.py, utente anonimo':<26} {'p50':>8} {'max':>8}")
+        for chiave in ("primo_disegno_ms", "prima_sessione_ms", "seconda_sessione_ms"):
+            tempi = [e[chiave] for e in esecuzioni if chiave in e]
+            if tempi:
+                print(f"{chiave:<26} {statistics.median(tempi):>8.1f} {max(tempi):>8.1f}")
+        ultima = esecuzioni[-1]
+        print(f"\nmoduli pesanti al primo disegno: {', '.join(ultima.get('moduli_al_primo_disegno', [])) or 'nessuno'}")
+        print(f"moduli pesanti a fine esecuzione: {', '.join(ultima.get('moduli_a_fine_esecuzione', [])) or 'nessuno'}")
+        if "errore" in ultima:
+            print(f"errore nell'esecuzione: {ultima['errore']}")
+        # La pagina anonima senza ricerche non deve caricare Firestore né numpy
+        vietati = sorted({m for e in esecuzioni for m in e.get("moduli_a_fine_esecuzione", [])} & set(MODULI_VIETATI_ANONIMO))
+        if vietati:
+            sys.exit(f"moduli caricati dalla pagina anonima: {', '.join(vietati)}")
+
+
+if __name__ == "__main__":
+    main()
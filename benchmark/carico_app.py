@@ -0,0 +1,175 @@
+"""
+Prova di carico di app.py: N sessioni concorrenti con Streamlit AppTest, servizi
+esterni finti (vedi stub_servizi.py) e Firestore sull'emulatore.
+
+Ogni utente virtuale fa accesso -> ricerca per città -> filtro per carburante ->
+conferma -> mappa -> segnalazione. Alla fine stampa i tempi di ogni passo visti dal
+"browser" e i tempi per fase registrati dall'app (metriche.py): chiamate a
+Places, lettura dei prezzi, tabella e statistiche, mappa, attesa su Firestore.
+
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python benchmark/carico_app.py [--utenti 20] [--citta 4]
+        [--ritardo-google-ms 80] [--profilo carico.prof] [--json risultati.json]
+
+Con --profilo i thread degli script vengono profilati con cProfile e le
+statistiche sono salvate nel file indicato (leggibili con snakeviz o pstats).
+"""
+import argparse
+import contextlib
+import cProfile
+import json
+import os
+import pstats
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_servizi import (CITTA, avvia_stub, connetti_emulatore, genera_distributori, nuova_sessione,  # noqa: E402
+                          per_etichetta, segreti_app, semina_firestore)
+
+from client_http import get_client  # noqa: E402
+from metriche import get_tempi_fasi  # noqa: E402
+
+PASSI = ["avvio", "accesso", "ricerca", "filtro", "conferma", "mappa", "segnalazione"]
+
+
+def flusso_utente(numero, email, citta, segreti, timeout_s):
+    """Esegue il percorso di un utente; restituisce ({passo: ms}, errore o None)."""
+    tempi = {}
+    sessione = nuova_sessione(segreti, timeout_s)
+
+    def passo(nome, azione):
+        inizio = time.perf_counter()
+        azione()
+        sessione.run()
+        tempi[nome] = (time.perf_counter() - inizio) * 1000
+        if sessione.exception:
+            raise RuntimeError(f"{nome}: {sessione.exception[0].message}")
+
+    try:
+        passo("avvio", lambda: None)
+        def accedi():
+            sessione.text_input(key="login_email").input(email)
+            sessione.text_input(key="login_password").input("password")
+            per_etichetta(sessione.button, "Accedi").click()
+        passo("accesso", accedi)
+        def cerca():
+            per_etichetta(sessione.text_input, "Scrivi il nome di un comune:").input(citta)
+            per_etichetta(sessione.button, "Cerca").click()
+        passo("ricerca", cerca)
+        passo("filtro", lambda: per_etichetta(sessione.selectbox, "Filtra per tipo di carburante:").set_value("Gasolio"))
+        conferme = [b for b in sessione.button if (b.key or "").startswith("conf_")]
+        if conferme:
+            # Utenti diversi confermano distributori diversi, come nella realtà
+            passo("conferma", conferme[numero % len(conferme)].click)
+        # La mappa si costruisce solo quando la si sceglie
+        passo("mappa", lambda: per_etichetta(sessione.radio, "Vista:").set_value("🗺️ Mappa"))
+        def segnala():
+            nomi = per_etichetta(sessione.selectbox, "1. Seleziona un distributore:")
+            nomi.set_value(nomi.options[numero % len(nomi.options)])
+            sessione.number_input(key="prezzo_Benzina").set_value(round(1.7 + numero % 100 / 1000, 3))
+            per_etichetta(sessione.button, "Invia Segnalazione").click()
+        passo("segnalazione", segnala)
+        return tempi, None
+    except Exception as e:
+        return tempi, f"utente {numero}: {e}" if isinstance(e, RuntimeError) else traceback.format_exc(limit=3)
+
+
+class ProfiloThread:
+    """cProfile segue un solo thread: ne avvia uno per ogni thread nuovo (gli script di AppTest girano su thread propri)."""
+
+    def __init__(self):
+        self._profili = []
+        self._lock = threading.Lock()
+
+    def _avvia(self, *_):
+        sys.setprofile(None)
+        profilo = cProfile.Profile()
+        with self._lock:
+            self._profili.append(profilo)
+        profilo.enable()
+
+    def __enter__(self):
+        threading.setprofile(self._avvia)
+        return self
+
+    def __exit__(self, *_):
+        threading.setprofile(None)
+
+    def salva(self, percorso, righe=25):
+        with self._lock:
+            profili = list(self._profili)
+        if not profili: return
+        statistiche_profilo = pstats.Stats(*profili)
+        statistiche_profilo.dump_stats(percorso)
+        statistiche_profilo.sort_stats("cumulative").print_stats(righe)
+
+
+def _riga(nome, valori):
+    if not valori: return f"{nome:<28} {'-':>6}"
+    ordinati = sorted(valori)
+    return (f"{nome:<28} {len(ordinati):>6} {statistics.median(ordinati):>9.1f} "
+            f"{ordinati[min(int(len(ordinati) * 0.95), len(ordinati) - 1)]:>9.1f} {ordinati[-1]:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--utenti", type=int, default=20)
+    parser.add_argument("--citta", type=int, default=4, help="città distinte cercate (meno città = più riuso delle cache)")
+    parser.add_argument("--distributori-per-citta", type=int, default=60)
+    parser.add_argument("--ritardo-google-ms", type=float, default=80)
+    parser.add_argument("--timeout", type=float, default=120, help="secondi massimi per ogni rerun")
+    parser.add_argument("--profilo", help="salva qui le statistiche di cProfile")
+    parser.add_argument("--json", help="salva qui i risultati, per confrontare esecuzioni diverse")
+    args = parser.parse_args()
+
+    db = connetti_emulatore()
+    distributori = genera_distributori(args.distributori_per_citta)
+    emails = [f"carico{i}@esempio.it" for i in range(args.utenti)]
+    semina_firestore(db, distributori, emails)
+    server, url_base = avvia_stub(distributori, args.ritardo_google_ms / 1000)
+    segreti = segreti_app(url_base)
+    citta = list(CITTA)[:max(1, min(args.citta, len(CITTA)))]
+
+    percorso_profilo = os.path.abspath(args.profilo) if args.profilo else None
+    percorso_json = os.path.abspath(args.json) if args.json else None
+    # L'indice SQLite dei distributori è relativo alla cartella corrente: ogni prova parte a freddo
+    cartella = tempfile.mkdtemp(prefix="carico_app_")
+    os.chdir(cartella)
+    get_tempi_fasi().azzera()
+    profilo = ProfiloThread() if percorso_profilo else None
+    inizio = time.perf_counter()
+    with profilo or contextlib.nullcontext():
+        with ThreadPoolExecutor(max_workers=args.utenti) as pool:
+            esiti = list(pool.map(lambda i: flusso_utente(i, emails[i], citta[i % len(citta)], segreti, args.timeout), range(args.utenti)))
+    durata = time.perf_counter() - inizio
+    server.shutdown()
+
+    errori = [errore for _, errore in esiti if errore]
+    passi = {p: [t[p] for t, _ in esiti if p in t] for p in PASSI}
+    fasi = get_tempi_fasi().riepilogo()
+    print(f"{args.utenti} utenti su {len(citta)} città in {durata:.1f} s, {len(errori)} con errori")
+    print(f"\n{'passo (ms)':<28} {'n':>6} {'p50':>9} {'p95':>9} {'max':>9}")
+    for p in PASSI:
+        print(_riga(p, passi[p]))
+    print(f"\n{'fase (ms, app)':<28} {'n':>6} {'p50':>9} {'p95':>9} {'max':>9} {'totale':>10}")
+    for fase, valori in sorted(fasi.items()):
+        print(f"{fase:<28} {valori['conteggio']:>6} {valori['p50_ms']:>9.1f} {valori['p95_ms']:>9.1f} {valori['massimo_ms']:>9.1f} {valori['totale_ms']:>10.1f}")
+    for errore in errori[:5]:
+        print(f"\n{errore}")
+    if profilo:
+        print()
+        profilo.salva(percorso_profilo)
+    if percorso_json:
+        with open(percorso_json, "w", encoding="utf-8") as f:
+            json.dump({"utenti": args.utenti, "citta": len(citta), "durata_s": durata, "errori": errori,
+                       "passi_ms": passi, "fasi": fasi, "http": get_client().statistiche()}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Latenze p50/p99 contro uno stub locale: requests "nudo" (una connessione per
+chiamata, come prima) rispetto al ClientHttp condiviso con keep-alive.
+
+Uso: python benchmark/client_http.py [--richieste 500] [--thread 8] [--ritardo-ms 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from client_http import ClientHttp  # noqa: E402
+
+
+def avvia_stub(ritardo_s):
+    class Gestore(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            time.sleep(ritardo_s)
+            corpo = json.dumps({"status": "OK", "results": []}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Gestore)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/place/nearbysearch/json"
+
+
+def misura(chiamata, richieste, thread):
+    def una(_):
+        inizio = time.perf_counter()
+        chiamata().raise_for_status()
+        return (time.perf_counter() - inizio) * 1000
+
+    with ThreadPoolExecutor(max_workers=thread) as pool:
+        tempi = sorted(pool.map(una, range(richieste)))
+    return statistics.median(tempi), tempi[int(len(tempi) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--richieste", type=int, default=500)
+    parser.add_argument("--thread", type=int, default=8)
+    parser.add_argument("--ritardo-ms", type=float, default=5)
+    args = parser.parse_args()
+    server, url = avvia_stub(args.ritardo_ms / 1000)
+    client = ClientHttp()
+    risultati = {
+        "requests.get (prima)": misura(lambda: requests.get(url, params={"key": "x"}), args.richieste, args.thread),
+        "ClientHttp (dopo)": misura(lambda: client.get("places", url, params={"key": "x"}), args.richieste, args.thread),
+    }
+    server.shutdown()
+    print(f"{'client':<22} {'p50 ms':>8} {'p99 ms':>8}")
+    for nome, (p50, p99) in risultati.items():
+        print(f"{nome:<22} {p50:>8.2f} {p99:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Throughput delle conferme concorrenti sullo stesso distributore, contro l'emulatore Firestore.
+
+Avviare prima l'emulatore (firebase emulators:start --only firestore) e poi:
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python benchmark/conferme_concorrenti.py [--utenti 100] [--thread 16]
+
+Alla fine verifica che conferme e punti siano coerenti: con scritture atomiche
+non si devono mai perdere punti.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from classifica import totali_utente  # noqa: E402
+from scritture_prezzi import PUNTI_CONFERMA, registra_conferma, registra_prezzi  # noqa: E402
+from stub_servizi import connetti_emulatore  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--utenti", type=int, default=100)
+    parser.add_argument("--thread", type=int, default=16)
+    args = parser.parse_args()
+    db = connetti_emulatore()
+
+    id_distributore = f"bench_{uuid.uuid4().hex[:8]}"
+    registra_prezzi(db, id_distributore, "Distributore di prova", {"Gasolio": 1.799}, "segnalatore")
+    utenti = [f"utente_{i}" for i in range(args.utenti)]
+
+    def conferma(user_id):
+        inizio = time.perf_counter()
+        esito = registra_conferma(db, id_distributore, "Gasolio", user_id)
+        return esito, (time.perf_counter() - inizio) * 1000
+
+    inizio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.thread) as pool:
+        risultati = list(pool.map(conferma, utenti))
+    durata = time.perf_counter() - inizio
+
+    tempi = sorted(t for _, t in risultati)
+    dati = db.collection("prezzi_segnalati").document(id_distributore).get().to_dict()
+    # I punti stanno sugli shard dei contatori (vedi classifica.py)
+    punti = sum(totali_utente(db, u, db.collection("utenti").document(u).get().to_dict())[0] for u in utenti)
+    print(f"conferme/s: {len(utenti) / durata:.1f}")
+    print(f"latenza p50: {statistics.median(tempi):.1f} ms, p99: {tempi[int(len(tempi) * 0.99) - 1]:.1f} ms")
+    print(f"conferme registrate: {dati['prezzi']['Gasolio']['conferme'] - 1} / {len(utenti)}")
+    print(f"punti assegnati: {punti} / {len(utenti) * PUNTI_CONFERMA}")
+
+
+if __name__ == "__main__":
+    main()
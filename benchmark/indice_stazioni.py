@@ -0,0 +1,59 @@
+"""
+Tempo di risposta dell'indice locale al crescere del numero di distributori.
+
+Uso: python benchmark/indice_stazioni.py [--ripetizioni 200]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indice_stazioni import IndiceStazioni, celle_per_raggio  # noqa: E402
+
+# Riquadro approssimativo dell'Italia peninsulare
+LAT_MIN, LAT_MAX, LON_MIN, LON_MAX = 37.0, 46.5, 7.0, 18.5
+DIMENSIONI = [1000, 5000, 10000, 22000]
+RAGGIO_M = 5000
+
+
+def stazioni_casuali(n, rng, inizio=0):
+    return [{"id": f"stazione_{inizio + i}", "nome": f"Distributore {inizio + i}", "indirizzo": "Via Roma",
+             "latitudine": str(rng.uniform(LAT_MIN, LAT_MAX)), "longitudine": str(rng.uniform(LON_MIN, LON_MAX))}
+            for i in range(n)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ripetizioni", type=int, default=200)
+    args = parser.parse_args()
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as cartella:
+        indice = IndiceStazioni(os.path.join(cartella, "indice.sqlite3"))
+        inseriti = 0
+        print(f"{'stazioni':>9} {'p50 ms':>8} {'p99 ms':>8} {'celle ms':>9} {'trovate':>8}")
+        for dimensione in DIMENSIONI:
+            indice.aggiorna_stazioni(stazioni_casuali(dimensione - inseriti, rng, inseriti))
+            inseriti = dimensione
+            tempi, tempi_celle, trovate = [], [], 0
+            for _ in range(args.ripetizioni):
+                lat, lon = rng.uniform(LAT_MIN, LAT_MAX), rng.uniform(LON_MIN, LON_MAX)
+                inizio = time.perf_counter()
+                celle = celle_per_raggio(lat, lon, RAGGIO_M, indice.precisione_celle)
+                indice.celle_da_aggiornare(celle, 3600)
+                tempi_celle.append(time.perf_counter() - inizio)
+                inizio = time.perf_counter()
+                trovate += len(indice.cerca_nel_raggio(lat, lon, RAGGIO_M))
+                tempi.append(time.perf_counter() - inizio)
+            tempi.sort()
+            print(f"{dimensione:>9} {statistics.median(tempi) * 1000:>8.3f} "
+                  f"{tempi[int(len(tempi) * 0.99) - 1] * 1000:>8.3f} "
+                  f"{statistics.median(tempi_celle) * 1000:>9.3f} {trovate / args.ripetizioni:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
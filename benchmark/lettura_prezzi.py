@@ -0,0 +1,143 @@
+"""
+Lettura dei prezzi per 20, 60 e 200 distributori: get_all a blocchi da 30 letti
+uno dopo l'altro contro gli stessi blocchi in parallelo sul pool condiviso,
+come fa leggi_prezzi_da_firebase (dati_prezzi.py).
+
+Di base usa un client finto con latenza regolabile per chiamata e per documento,
+così la misura non dipende dalla rete; con FIRESTORE_EMULATOR_HOST impostato
+legge invece dall'emulatore, dopo averlo popolato.
+
+    python benchmark/lettura_prezzi.py [--ripetizioni 20] [--latenza-ms 40] [--latenza-documento-ms 0.2]
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python benchmark/lettura_prezzi.py
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from connessione import MAX_THREAD_PREZZI  # noqa: E402
+from dati_prezzi import DIMENSIONE_BLOCCO_PREZZI, _leggi_blocco_prezzi  # noqa: E402
+from stub_servizi import connetti_emulatore  # noqa: E402
+
+NUMERI_DISTRIBUTORI = [20, 60, 200]
+
+
+class _DocumentoFinto:
+    def __init__(self, id_documento, dati):
+        self.id, self._dati = id_documento, dati
+        self.exists = dati is not None
+
+    def to_dict(self):
+        return self._dati
+
+
+class _RiferimentoFinto:
+    def __init__(self, id_documento):
+        self.id = id_documento
+
+
+class _CollezioneFinta:
+    def document(self, id_documento):
+        return _RiferimentoFinto(id_documento)
+
+
+class ClientFinto:
+    """Solo quello che serve a _leggi_blocco_prezzi: collection().document() e get_all()."""
+
+    def __init__(self, documenti, latenza_s, latenza_documento_s):
+        self._documenti = documenti
+        self._latenza_s, self._latenza_documento_s = latenza_s, latenza_documento_s
+
+    def collection(self, _nome):
+        return _CollezioneFinta()
+
+    def get_all(self, refs):
+        # Un giro di rete per chiamata più il tempo di trasferimento dei documenti
+        time.sleep(self._latenza_s + self._latenza_documento_s * len(refs))
+        return [_DocumentoFinto(r.id, self._documenti.get(r.id)) for r in refs]
+
+
+def documenti_di_prova(numero, quota_con_prezzo=0.6, seme=3):
+    rng = random.Random(seme)
+    return {f"bench_lettura_{i}": {"id": f"bench_lettura_{i}", "nome_distributore": f"Distributore {i}",
+                                   "prezzi": {"Gasolio": {"valore": round(rng.uniform(1.6, 2.1), 3), "conferme": 1}}}
+            for i in range(numero) if rng.random() < quota_con_prezzo}
+
+
+def popola_emulatore(documenti):
+    db = connetti_emulatore()
+    voci = list(documenti.items())
+    for i in range(0, len(voci), 400):
+        batch = db.batch()
+        for id_documento, dati in voci[i:i + 400]:
+            batch.set(db.collection("prezzi_segnalati").document(id_documento), dati)
+        batch.commit()
+    return db
+
+
+def _blocchi(ids):
+    return [ids[i:i + DIMENSIONE_BLOCCO_PREZZI] for i in range(0, len(ids), DIMENSIONE_BLOCCO_PREZZI)]
+
+
+def leggi_in_sequenza(db, ids):
+    letti = {}
+    for blocco in _blocchi(ids):
+        letti.update(_leggi_blocco_prezzi(db, blocco))
+    return letti
+
+
+def leggi_in_parallelo(db, ids, pool):
+    blocchi = _blocchi(ids)
+    if len(blocchi) == 1:
+        return _leggi_blocco_prezzi(db, blocchi[0])
+    letti = {}
+    for risultato in pool.map(lambda blocco: _leggi_blocco_prezzi(db, blocco), blocchi):
+        letti.update(risultato)
+    return letti
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ripetizioni", type=int, default=20)
+    parser.add_argument("--latenza-ms", type=float, default=40, help="solo client finto: attesa per chiamata get_all")
+    parser.add_argument("--latenza-documento-ms", type=float, default=0.2, help="solo client finto: attesa per documento")
+    args = parser.parse_args()
+
+    totale = max(NUMERI_DISTRIBUTORI)
+    documenti = documenti_di_prova(totale)
+    if os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        db, origine = popola_emulatore(documenti), "emulatore"
+    else:
+        db, origine = ClientFinto(documenti, args.latenza_ms / 1000, args.latenza_documento_ms / 1000), "client finto"
+    pool = ThreadPoolExecutor(max_workers=MAX_THREAD_PREZZI)
+    rng = random.Random(9)
+    tutti = [f"bench_lettura_{i}" for i in range(totale)]
+
+    print(f"{origine}, blocchi da {DIMENSIONE_BLOCCO_PREZZI}, {MAX_THREAD_PREZZI} thread")
+    print(f"{'distributori':>12} {'blocchi':>8} {'sequenza p50':>13} {'parallelo p50':>14} {'parallelo p95':>14} {'trovati':>8}")
+    for numero in NUMERI_DISTRIBUTORI:
+        tempi_sequenza, tempi_parallelo, trovati = [], [], 0
+        for _ in range(args.ripetizioni):
+            ids = rng.sample(tutti, numero)
+            inizio = time.perf_counter()
+            attesi = leggi_in_sequenza(db, ids)
+            tempi_sequenza.append((time.perf_counter() - inizio) * 1000)
+            inizio = time.perf_counter()
+            letti = leggi_in_parallelo(db, ids, pool)
+            tempi_parallelo.append((time.perf_counter() - inizio) * 1000)
+            assert letti == attesi
+            trovati += len(letti)
+        tempi_parallelo.sort()
+        p95 = tempi_parallelo[min(int(len(tempi_parallelo) * 0.95), len(tempi_parallelo) - 1)]
+        print(f"{numero:>12} {len(_blocchi(ids)):>8} {statistics.median(tempi_sequenza):>13.1f} "
+              f"{statistics.median(tempi_parallelo):>14.1f} {p95:>14.1f} {trovati / args.ripetizioni:>8.1f}")
+    pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Tempo di costruzione e dimensione dell'HTML della mappa per 50, 500 e 5.000 distributori:
+un folium.Marker per distributore (com'era) contro un unico FastMarkerCluster.
+
+Uso: python benchmark/mappa.py
+"""
+import os
+import random
+import sys
+import time
+
+import folium
+from folium.plugins import MarkerCluster
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mappa_distributori import (aggiungi_distributori_sulla_mappa, crea_mappa_base,  # noqa: E402
+                                righe_marker, sostituisci_livello)
+
+DIMENSIONI = [50, 500, 5000]
+
+
+def dati_casuali(n, rng):
+    distributori = [{"id": f"s{i}", "nome": f"Distributore {i}", "indirizzo": "Via Roma 1",
+                     "latitudine": str(rng.uniform(45.3, 45.6)), "longitudine": str(rng.uniform(9.0, 9.3))}
+                    for i in range(n)]
+    prezzi = {d["id"]: {"prezzi": {"Gasolio": {"valore": round(rng.uniform(1.6, 2.1), 3), "conferme": 3}}}
+              for d in distributori if rng.random() < 0.5}
+    return distributori, prezzi
+
+
+def mappa_con_marker(distributori, prezzi):
+    mappa = crea_mappa_base([45.46, 9.19], 12)
+    cluster = MarkerCluster().add_to(mappa)
+    for lat, lon, popup, colore in righe_marker(distributori, prezzi):
+        folium.Marker(location=[lat, lon], popup=popup, icon=folium.Icon(color=colore, icon="gas-pump", prefix="fa")).add_to(cluster)
+    return mappa
+
+
+def mappa_veloce(distributori, prezzi):
+    mappa = crea_mappa_base([45.46, 9.19], 12)
+    livello = aggiungi_distributori_sulla_mappa(mappa, righe_marker(distributori, prezzi))
+    return mappa, livello
+
+
+def misura(funzione):
+    inizio = time.perf_counter()
+    mappa = funzione()
+    costruzione = time.perf_counter() - inizio
+    inizio = time.perf_counter()
+    html = mappa.get_root().render()
+    return costruzione * 1000, (time.perf_counter() - inizio) * 1000, len(html.encode())
+
+
+def main():
+    rng = random.Random(11)
+    print(f"{'distributori':>12} {'metodo':<16} {'costr. ms':>10} {'render ms':>10} {'HTML KB':>9}")
+    for n in DIMENSIONI:
+        distributori, prezzi = dati_casuali(n, rng)
+        risultati = {
+            "Marker": misura(lambda: mappa_con_marker(distributori, prezzi)),
+            "FastMarker": misura(lambda: mappa_veloce(distributori, prezzi)[0]),
+        }
+        mappa, livello = mappa_veloce(distributori, prezzi)
+        risultati["solo prezzi"] = misura(lambda: (sostituisci_livello(mappa, livello, righe_marker(distributori, prezzi)), mappa)[1])
+        for metodo, (costruzione, render, byte) in risultati.items():
+            print(f"{n:>12} {metodo:<16} {costruzione:>10.1f} {render:>10.1f} {byte / 1024:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
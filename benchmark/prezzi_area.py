@@ -0,0 +1,72 @@
+"""
+Ricerca per area su geohash contro il percorso attuale con la lista di ID
+(indice locale + get_all a blocchi), sull'emulatore Firestore.
+
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python benchmark/prezzi_area.py [--distributori 5000] [--ripetizioni 30]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from area_prezzi import campi_geohash, cerca_prezzi_in_area  # noqa: E402
+from indice_stazioni import IndiceStazioni  # noqa: E402
+from stub_servizi import connetti_emulatore  # noqa: E402
+
+RAGGI_KM = [2, 5, 10, 20]
+BLOCCO_ID = 30
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--distributori", type=int, default=5000)
+    parser.add_argument("--ripetizioni", type=int, default=30)
+    args = parser.parse_args()
+    db = connetti_emulatore()
+    rng = random.Random(5)
+    pool = ThreadPoolExecutor(max_workers=8)
+
+    with tempfile.TemporaryDirectory() as cartella:
+        indice = IndiceStazioni(os.path.join(cartella, "indice.sqlite3"))
+        stazioni = [{"id": f"bench_area_{i}", "nome": f"Distributore {i}", "indirizzo": "Via Roma",
+                     "latitudine": str(rng.uniform(45.2, 45.7)), "longitudine": str(rng.uniform(8.9, 9.5))}
+                    for i in range(args.distributori)]
+        indice.aggiorna_stazioni(stazioni)
+        for i in range(0, len(stazioni), 400):
+            batch = db.batch()
+            for s in stazioni[i:i + 400]:
+                batch.set(db.collection("prezzi_segnalati").document(s["id"]), {
+                    "id": s["id"], "nome_distributore": s["nome"],
+                    "prezzi": {"Gasolio": {"valore": round(rng.uniform(1.6, 2.1), 3), "conferme": 1}},
+                    **campi_geohash(float(s["latitudine"]), float(s["longitudine"]))})
+            batch.commit()
+
+        def per_id(lat, lon, raggio_m):
+            ids = [s["id"] for s in indice.cerca_nel_raggio(lat, lon, raggio_m)]
+            blocchi = [ids[i:i + BLOCCO_ID] for i in range(0, len(ids), BLOCCO_ID)]
+            refs = lambda blocco: [db.collection("prezzi_segnalati").document(i) for i in blocco]
+            return [d for risultato in pool.map(lambda b: list(db.get_all(refs(b))), blocchi) for d in risultato]
+
+        print(f"{'raggio km':>9} {'geohash ms':>11} {'lista ID ms':>12} {'trovati':>8}")
+        for raggio_km in RAGGI_KM:
+            tempi_geo, tempi_id, trovati = [], [], 0
+            for _ in range(args.ripetizioni):
+                lat, lon = rng.uniform(45.3, 45.6), rng.uniform(9.0, 9.4)
+                inizio = time.perf_counter()
+                trovati += len(cerca_prezzi_in_area(db, lat, lon, raggio_km * 1000, pool=pool))
+                tempi_geo.append((time.perf_counter() - inizio) * 1000)
+                inizio = time.perf_counter()
+                per_id(lat, lon, raggio_km * 1000)
+                tempi_id.append((time.perf_counter() - inizio) * 1000)
+            print(f"{raggio_km:>9} {statistics.median(tempi_geo):>11.1f} {statistics.median(tempi_id):>12.1f} "
+                  f"{trovati / args.ripetizioni:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Incrementi di punti concorrenti sullo stesso utente, contro l'emulatore Firestore:
+un solo documento (com'era) contro i contatori distribuiti di classifica.py.
+
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python benchmark/punti_concorrenti.py [--incrementi 1000] [--thread 32]
+
+L'emulatore non applica il limite di una scrittura al secondo per documento, ma
+la contesa sul documento unico si vede già nelle latenze; alla fine si verifica
+che la somma degli shard sia esatta e si misura una materializzazione.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from firebase_admin import firestore
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from classifica import aggiungi_punti, leggi_classifica, materializza_classifiche, totali_utente  # noqa: E402
+from stub_servizi import connetti_emulatore  # noqa: E402
+
+
+def misura(incrementa, incrementi, thread):
+    def uno(_):
+        inizio = time.perf_counter()
+        incrementa()
+        return (time.perf_counter() - inizio) * 1000
+
+    inizio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=thread) as pool:
+        tempi = sorted(pool.map(uno, range(incrementi)))
+    durata = time.perf_counter() - inizio
+    return incrementi / durata, statistics.median(tempi), tempi[int(len(tempi) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--incrementi", type=int, default=1000)
+    parser.add_argument("--thread", type=int, default=32)
+    args = parser.parse_args()
+    db = connetti_emulatore()
+
+    uid_singolo, uid_shard = f"bench_{uuid.uuid4().hex[:8]}", f"bench_{uuid.uuid4().hex[:8]}"
+    for uid in (uid_singolo, uid_shard):
+        db.collection("utenti").document(uid).set({"email": f"{uid}@esempio.it", "punti": 0})
+
+    def incremento_singolo():
+        db.collection("utenti").document(uid_singolo).update({"punti": firestore.Increment(2)})
+
+    def incremento_shard():
+        batch = db.batch()
+        aggiungi_punti(db, batch, uid_shard, 2, citta="Milano")
+        batch.commit()
+
+    print(f"{'metodo':<18} {'incr./s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for nome, funzione in (("documento unico", incremento_singolo), ("shard", incremento_shard)):
+        al_secondo, p50, p99 = misura(funzione, args.incrementi, args.thread)
+        print(f"{nome:<18} {al_secondo:>9.1f} {p50:>8.1f} {p99:>8.1f}")
+
+    punti, _, per_citta, _ = totali_utente(db, uid_shard, db.collection("utenti").document(uid_shard).get().to_dict())
+    print(f"somma degli shard: {punti} / {args.incrementi * 2} (Milano: {per_citta.get('Milano', 0)})")
+    inizio = time.perf_counter()
+    materializza_classifiche(db)
+    print(f"materializzazione: {(time.perf_counter() - inizio) * 1000:.0f} ms, "
+          f"prima posizione: {(leggi_classifica(db) or {}).get('voci', [{}])[0]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Throughput di codifica (aggiunta) e di interrogazione dello storico su milioni di campioni.
+
+Lavora su documenti in memoria con la stessa forma di quelli salvati su
+Firestore, quindi misura solo codifica, decodifica e aggregazioni.
+
+Uso: python benchmark/storico_prezzi.py [--campioni 2000000] [--distributori 500]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storico_prezzi import (SerieStorica, codice_mese, codifica_campione,  # noqa: E402
+                            inizio_mese, statistiche_area)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--campioni", type=int, default=2_000_000)
+    parser.add_argument("--distributori", type=int, default=500)
+    args = parser.parse_args()
+    rng = random.Random(7)
+    adesso = int(time.time())
+    periodo = 365 * 86400
+
+    documenti = {}
+    inizio = time.perf_counter()
+    for _ in range(args.campioni):
+        istante = adesso - rng.randrange(periodo)
+        chiave = (f"stazione_{rng.randrange(args.distributori)}", codice_mese(istante))
+        doc = documenti.get(chiave)
+        if doc is None:
+            doc = documenti[chiave] = {"inizio_mese": inizio_mese(istante), "campioni": []}
+        doc["campioni"].append(codifica_campione(istante, rng.uniform(1.6, 2.1)))
+    durata = time.perf_counter() - inizio
+    print(f"aggiunta: {args.campioni / durata:,.0f} campioni/s ({len(documenti)} documenti mensili)")
+
+    per_distributore = {}
+    for (id_distributore, _), doc in documenti.items():
+        per_distributore.setdefault(id_distributore, []).append(doc)
+    inizio = time.perf_counter()
+    serie = {id_distributore: SerieStorica.da_documenti(docs) for id_distributore, docs in per_distributore.items()}
+    durata = time.perf_counter() - inizio
+    print(f"decodifica: {args.campioni / durata:,.0f} campioni/s")
+
+    for giorni in (7, 30, 365):
+        inizio = time.perf_counter()
+        finestra = {k: s.dal(adesso - giorni * 86400) for k, s in serie.items()}
+        statistiche = statistiche_area(finestra)
+        durata = time.perf_counter() - inizio
+        print(f"ultimi {giorni:>3} giorni: {statistiche['campioni']:>9,} campioni in {durata * 1000:8.1f} ms, "
+              f"media {statistiche['media']:.3f} €")
+
+
+if __name__ == "__main__":
+    main()
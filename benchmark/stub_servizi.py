@@ -0,0 +1,168 @@
+"""
+Servizi finti per far girare app.py in locale, usati dai benchmark dell'app.
+
+- Google Places e Identity Toolkit: un server HTTP locale con latenza regolabile,
+  raggiunto dall'app tramite i segreti google_places_url e identity_toolkit_url.
+- Firestore: l'emulatore. Inizializzando qui l'app Firebase predefinita,
+  get_db (connessione.py) salta le credenziali dei segreti e usa direttamente firestore.client().
+"""
+import hashlib
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+RADICE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RADICE)
+
+from client_firestore import crea_client_firestore  # noqa: E402
+from indice_stazioni import distanza_m  # noqa: E402
+
+PERCORSO_APP = os.path.join(RADICE, "app.py")
+CITTA = {
+    "Milano": (45.4642, 9.1900), "Torino": (45.0703, 7.6869), "Bologna": (44.4949, 11.3426),
+    "Firenze": (43.7696, 11.2558), "Roma": (41.9028, 12.4964), "Napoli": (40.8518, 14.2681),
+    "Bari": (41.1171, 16.8719), "Palermo": (38.1157, 13.3615),
+}
+RISULTATI_PER_PAGINA = 20
+CARBURANTI = ["Benzina", "Gasolio", "GPL", "Metano"]
+
+
+def genera_distributori(per_citta, raggio_m=4000, seme=7):
+    """{città: [risultato nel formato di Places]} con distributori sparsi attorno al centro."""
+    rng = random.Random(seme)
+    distributori = {}
+    for citta, (lat, lon) in CITTA.items():
+        luoghi = []
+        for i in range(per_citta):
+            distanza, angolo = raggio_m * math.sqrt(rng.random()), rng.uniform(0, 2 * math.pi)
+            d_lat = math.degrees(distanza * math.cos(angolo) / 6371000)
+            d_lon = math.degrees(distanza * math.sin(angolo) / (6371000 * math.cos(math.radians(lat))))
+            luoghi.append({"place_id": f"stub_{citta.lower()}_{i}", "name": f"Distributore {citta} {i}",
+                           "vicinity": f"Via Roma {i + 1}, {citta}",
+                           "geometry": {"location": {"lat": lat + d_lat, "lng": lon + d_lon}}})
+        distributori[citta] = luoghi
+    return distributori
+
+
+def uid_per_email(email):
+    return "stub_" + hashlib.sha1(email.encode()).hexdigest()[:20]
+
+
+def avvia_stub(distributori, ritardo_s=0.05):
+    """Avvia il server in un thread e restituisce (server, url base)."""
+    tutti = [luogo for luoghi in distributori.values() for luogo in luoghi]
+    # Il token di pagina porta con sé gli ID ancora da restituire
+    pagine = {}
+    lock = threading.Lock()
+
+    def pagina(risultati):
+        corpo = {"status": "OK" if risultati else "ZERO_RESULTS", "results": risultati[:RISULTATI_PER_PAGINA]}
+        if len(risultati) > RISULTATI_PER_PAGINA:
+            token = os.urandom(8).hex()
+            with lock:
+                pagine[token] = risultati[RISULTATI_PER_PAGINA:]
+            corpo["next_page_token"] = token
+        return corpo
+
+    class Gestore(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _rispondi(self, corpo, stato=200):
+            dati = json.dumps(corpo).encode()
+            self.send_response(stato)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(dati)))
+            self.end_headers()
+            self.wfile.write(dati)
+
+        def do_GET(self):
+            time.sleep(ritardo_s)
+            indirizzo = urlparse(self.path)
+            parametri = {k: v[0] for k, v in parse_qs(indirizzo.query).items()}
+            if "pagetoken" in parametri:
+                with lock:
+                    restanti = pagine.pop(parametri["pagetoken"], None)
+                return self._rispondi(pagina(restanti) if restanti is not None else {"status": "INVALID_REQUEST"})
+            if indirizzo.path.endswith("/textsearch/json"):
+                citta = parametri.get("query", "").rsplit(" a ", 1)[-1].strip().title()
+                return self._rispondi(pagina(distributori.get(citta, [])))
+            if indirizzo.path.endswith("/nearbysearch/json"):
+                lat, lon = (float(v) for v in parametri["location"].split(","))
+                raggio = float(parametri.get("radius", 5000))
+                vicini = [l for l in tutti if distanza_m(lat, lon, l["geometry"]["location"]["lat"], l["geometry"]["location"]["lng"]) <= raggio]
+                return self._rispondi(pagina(vicini))
+            self._rispondi({"status": "NOT_FOUND"}, 404)
+
+        def do_POST(self):
+            time.sleep(ritardo_s)
+            lunghezza = int(self.headers.get("Content-Length", 0))
+            corpo = json.loads(self.rfile.read(lunghezza) or b"{}")
+            metodo = urlparse(self.path).path.rsplit(":", 1)[-1]
+            if metodo in ("signUp", "signInWithPassword"):
+                email = corpo.get("email", "")
+                return self._rispondi({"localId": uid_per_email(email), "email": email, "idToken": "token_" + uid_per_email(email)})
+            if metodo in ("sendOobCode", "delete"):
+                return self._rispondi({})
+            self._rispondi({"error": {"message": "METODO_SCONOSCIUTO"}}, 400)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Gestore)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def segreti_app(url_base):
+    return {
+        "google_api_key": "stub", "firebase_web_api_key": "stub",
+        "google_places_url": f"{url_base}/place", "identity_toolkit_url": f"{url_base}/identity",
+        # Lo stub rende validi i token di pagina subito
+        "google_places_ritardo_token": 0.1,
+    }
+
+
+def connetti_emulatore():
+    """Client Firestore sull'emulatore, registrato come app Firebase predefinita anche per app.py."""
+    if not os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        sys.exit("Imposta FIRESTORE_EMULATOR_HOST: i benchmark scrivono solo sull'emulatore.")
+    return crea_client_firestore(leggi_credenziali=None)
+
+
+def semina_firestore(db, distributori, emails, quota_con_prezzo=0.5, seme=11):
+    """Prezzi per una parte dei distributori e profili con privacy accettata per gli utenti."""
+    rng = random.Random(seme)
+    scritture = []
+    for luogo in (l for luoghi in distributori.values() for l in luoghi):
+        if rng.random() >= quota_con_prezzo: continue
+        prezzi = {c: {"valore": round(rng.uniform(1.6, 2.1), 3), "conferme": 1, "segnalato_da": ["seme"]}
+                  for c in rng.sample(CARBURANTI, rng.randint(1, len(CARBURANTI)))}
+        scritture.append((db.collection("prezzi_segnalati").document(luogo["place_id"]),
+                          {"id": luogo["place_id"], "nome_distributore": luogo["name"], "prezzi": prezzi}))
+    for email in emails:
+        scritture.append((db.collection("utenti").document(uid_per_email(email)),
+                          {"email": email, "privacy_accepted": True, "punti": 0, "numero_segnalazioni": 0}))
+    for i in range(0, len(scritture), 400):
+        batch = db.batch()
+        for riferimento, dati in scritture[i:i + 400]:
+            batch.set(riferimento, dati)
+        batch.commit()
+
+
+def nuova_sessione(segreti, timeout_s=60):
+    """Un AppTest di app.py: ognuno è una sessione, le cache st.cache_resource sono del processo."""
+    from streamlit.testing.v1 import AppTest
+    sessione = AppTest.from_file(PERCORSO_APP, default_timeout=timeout_s)
+    sessione.secrets.update(segreti)
+    return sessione
+
+
+def per_etichetta(elementi, etichetta):
+    return next(e for e in elementi if e.label == etichetta)
@@ -0,0 +1,65 @@
+"""
+Microbenchmark della sezione risultati con 10k distributori: dizionari (com'era)
+contro la TabellaPrezzi a colonne.
+
+Uso: python benchmark/tabella_prezzi.py [--distributori 10000] [--ripetizioni 20]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tabella_prezzi import TabellaPrezzi  # noqa: E402
+
+CARBURANTI = ["Benzina", "Gasolio", "GPL", "Metano"]
+
+
+def dati_casuali(n, rng):
+    distributori = [{"id": f"s{i}", "nome": f"Distributore {i}", "indirizzo": "Via Roma",
+                     "latitudine": str(rng.uniform(45.3, 45.6)), "longitudine": str(rng.uniform(9.0, 9.3))}
+                    for i in range(n)]
+    prezzi = {d["id"]: {"prezzi": {c: {"valore": round(rng.uniform(1.6, 2.1), 3), "conferme": rng.randrange(1, 20)}
+                                   for c in CARBURANTI if rng.random() < 0.6}}
+              for d in distributori if rng.random() < 0.8}
+    return distributori, prezzi
+
+
+def con_dizionari(distributori, prezzi, carburante):
+    tipi = sorted(set(c for p in prezzi.values() for c in p.get("prezzi", {})))
+    con_prezzo = [d for d in distributori if d["id"] in prezzi and carburante in prezzi[d["id"]].get("prezzi", {})]
+    ordinati = sorted(con_prezzo, key=lambda d: float(prezzi[d["id"]]["prezzi"][carburante]["valore"]))
+    valori = [float(prezzi[d["id"]]["prezzi"][carburante]["valore"]) for d in ordinati]
+    return tipi, ordinati, (min(valori), max(valori), sum(valori) / len(valori))
+
+
+def con_tabella(tabella, distributori, carburante):
+    righe = tabella.ordina_per_prezzo(carburante)
+    return tabella.carburanti, [distributori[i] for i in righe], tabella.statistiche(carburante)
+
+
+def cronometra(funzione, ripetizioni):
+    inizio = time.perf_counter()
+    for _ in range(ripetizioni):
+        funzione()
+    return (time.perf_counter() - inizio) / ripetizioni * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--distributori", type=int, default=10_000)
+    parser.add_argument("--ripetizioni", type=int, default=20)
+    args = parser.parse_args()
+    distributori, prezzi = dati_casuali(args.distributori, random.Random(3))
+    tabella = TabellaPrezzi(distributori, prezzi)
+
+    print(f"dizionari, per rerun:          {cronometra(lambda: con_dizionari(distributori, prezzi, 'Gasolio'), args.ripetizioni):8.2f} ms")
+    print(f"tabella, costruzione (1/ricerca): {cronometra(lambda: TabellaPrezzi(distributori, prezzi), args.ripetizioni):8.2f} ms")
+    print(f"tabella, per rerun:            {cronometra(lambda: con_tabella(tabella, distributori, 'Gasolio'), args.ripetizioni):8.2f} ms")
+    print(f"tabella, convenienza:          {cronometra(lambda: tabella.ordina_per_convenienza('Gasolio', 45.46, 9.19), args.ripetizioni):8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheConScadenza:
+    """
+    Cache in memoria condivisa tra le sessioni, con scadenza per chiave.
+    Tiene il conto di hit, miss ed evizioni per poterne osservare l'efficacia.
+    """
+
+    def __init__(self, ttl_secondi, max_voci=None):
+        self.ttl_secondi = ttl_secondi
+        self.max_voci = max_voci
+        # Il TTL è uguale per tutte le voci: l'ordine di scrittura è anche l'ordine di scadenza
+        self._voci = OrderedDict()
+        self._lock = threading.Lock()
+        self.statistiche = {"hit": 0, "miss": 0, "evizioni": 0, "scadute": 0}
+
+    def leggi(self, chiave):
+        with self._lock:
+            voce = self._voci.get(chiave)
+            if voce is None:
+                self.statistiche["miss"] += 1
+                return None
+            valore, scadenza = voce
+            if scadenza < time.monotonic():
+                del self._voci[chiave]
+                self.statistiche["scadute"] += 1
+                self.statistiche["miss"] += 1
+                return None
+            self.statistiche["hit"] += 1
+            return valore
+
+    def leggi_molti(self, chiavi):
+        """Restituisce le voci presenti e la lista delle chiavi mancanti."""
+        trovati, mancanti = {}, []
+        for chiave in chiavi:
+            valore = self.leggi(chiave)
+            if valore is None:
+                mancanti.append(chiave)
+            else:
+                trovati[chiave] = valore
+        return trovati, mancanti
+
+    def presenti(self, chiavi):
+        """Chiavi con una voce ancora valida, senza toccare le statistiche."""
+        with self._lock:
+            adesso = time.monotonic()
+            return {chiave for chiave in chiavi if chiave in self._voci and self._voci[chiave][1] >= adesso}
+
+    def _togli_scadute(self, adesso):
+        # Le voci scadute stanno tutte in testa: ci si ferma alla prima ancora valida
+        while self._voci:
+            chiave, (_, scadenza) = next(iter(self._voci.items()))
+            if scadenza >= adesso: break
+            del self._voci[chiave]
+            self.statistiche["scadute"] += 1
+
+    def scrivi(self, chiave, valore):
+        with self._lock:
+            adesso = time.monotonic()
+            self._togli_scadute(adesso)
+            if chiave in self._voci:
+                # La nuova scadenza è la più lontana: la voce va in coda
+                self._voci.move_to_end(chiave)
+            elif self.max_voci and len(self._voci) >= self.max_voci:
+                # Togliamo la voce più vicina alla scadenza, cioè la prima
+                self._voci.popitem(last=False)
+                self.statistiche["evizioni"] += 1
+            self._voci[chiave] = (valore, adesso + self.ttl_secondi)
+
+    def invalida(self, chiave):
+        with self._lock:
+            if self._voci.pop(chiave, None) is not None:
+                self.statistiche["evizioni"] += 1
+
+    def svuota(self):
+        with self._lock:
+            self.statistiche["evizioni"] += len(self._voci)
+            self._voci.clear()
+
+    def riepilogo(self):
+        with self._lock:
+            letture = self.statistiche["hit"] + self.statistiche["miss"]
+            return {
+                **self.statistiche,
+                "voci": len(self._voci),
+                "hit_ratio": round(self.statistiche["hit"] / letture, 3) if letture else 0.0,
+            }
@@ -0,0 +1,150 @@
+"""
+Punti degli utenti su contatori distribuiti e classifiche precalcolate.
+
+Ogni incremento va su uno shard casuale in utenti/{uid}/contatori, così un
+utente molto attivo non supera il limite di circa una scrittura al secondo per
+documento. Periodicamente i totali degli utenti cambiati vengono riportati sul
+loro documento (punti_totali, punti_citta_totali) e le prime posizioni, generale
+e per città, sono salvate in classifiche/*: l'app legge un solo documento.
+"""
+import random
+import re
+import time
+from datetime import datetime, timezone
+
+from firebase_admin import firestore
+
+NUMERO_SHARD = 10
+POSIZIONI_CLASSIFICA = 20
+DURATA_BLOCCO_SECONDI = 5 * 60
+COLLEZIONE_CLASSIFICHE = "classifiche"
+
+
+# --- Contatori distribuiti ---
+def aggiungi_punti(db, scrittura, uid, punti, segnalazioni=0, citta=None):
+    """Accoda l'incremento a un WriteBatch o a una Transaction già aperti."""
+    shard_ref = db.collection("utenti").document(uid).collection("contatori").document(str(random.randrange(NUMERO_SHARD)))
+    incremento = {"punti": firestore.Increment(punti), "aggiornato_il": firestore.SERVER_TIMESTAMP}
+    if segnalazioni:
+        incremento["numero_segnalazioni"] = firestore.Increment(segnalazioni)
+    if citta:
+        incremento["punti_citta"] = {citta: firestore.Increment(punti)}
+    scrittura.set(shard_ref, incremento, merge=True)
+
+
+def totali_utente(db, uid, profilo):
+    """
+    Somma i punti sul documento utente (quelli precedenti agli shard) e gli shard.
+    Restituisce (punti, numero_segnalazioni, {città: punti}, shard letti).
+    """
+    profilo = profilo or {}
+    punti, segnalazioni = profilo.get("punti", 0), profilo.get("numero_segnalazioni", 0)
+    per_citta, shard_letti = {}, 0
+    for shard in db.collection("utenti").document(uid).collection("contatori").stream():
+        shard_letti += 1
+        dati = shard.to_dict()
+        punti += dati.get("punti", 0)
+        segnalazioni += dati.get("numero_segnalazioni", 0)
+        for citta, valore in dati.get("punti_citta", {}).items():
+            per_citta[citta] = per_citta.get(citta, 0) + valore
+    return punti, segnalazioni, per_citta, shard_letti
+
+
+def citta_da_indirizzo(indirizzo):
+    """L'ultima parte di un indirizzo di Google ("Via Roma, 1, Milano" -> "Milano")."""
+    if not indirizzo or indirizzo == "N/D": return None
+    parte = indirizzo.split(",")[-1]
+    # Toglie CAP e sigla della provincia, se presenti
+    parte = re.sub(r"\b\d{5}\b|\b[A-Z]{2}\b", "", parte).strip()
+    return parte.title() or None
+
+
+def id_classifica(citta=None):
+    if not citta: return "generale"
+    return "citta_" + re.sub(r"[^a-z0-9]+", "_", citta.lower()).strip("_")
+
+
+def nome_pubblico(email):
+    # In classifica non mostriamo l'email intera
+    if not email or "@" not in email: return "Anonimo"
+    nome, dominio = email.split("@", 1)
+    return f"{nome[:2]}***@{dominio}"
+
+
+# --- Materializzazione ---
+def _prendi_blocco(db):
+    """Un solo processo alla volta ricalcola le classifiche."""
+    blocco_ref = db.collection(COLLEZIONE_CLASSIFICHE).document("_blocco")
+
+    @firestore.transactional
+    def prendi(transaction):
+        dati = blocco_ref.get(transaction=transaction).to_dict() or {}
+        adesso = time.time()
+        if dati.get("fino_a", 0) > adesso:
+            return None
+        transaction.set(blocco_ref, {"fino_a": adesso + DURATA_BLOCCO_SECONDI})
+        return dati.get("ultima_esecuzione", 0)
+
+    return prendi(db.transaction())
+
+
+def _scrivi_classifica(db, citta, query, campo):
+    voci = []
+    for doc in query.limit(POSIZIONI_CLASSIFICA).stream():
+        dati = doc.to_dict()
+        valore = dati.get(campo) if not citta else dati.get(campo, {}).get(citta, 0)
+        voci.append({"nome": nome_pubblico(dati.get("email")), "punti": valore})
+    db.collection(COLLEZIONE_CLASSIFICHE).document(id_classifica(citta)).set(
+        {"citta": citta, "voci": voci, "aggiornata_il": firestore.SERVER_TIMESTAMP})
+
+
+def materializza_classifiche(db):
+    """
+    Riporta sul documento utente i totali degli utenti con shard cambiati dall'ultima
+    esecuzione e riscrive le classifiche toccate. Restituisce False se un altro
+    processo la sta già eseguendo.
+    """
+    ultima_esecuzione = _prendi_blocco(db)
+    if ultima_esecuzione is None: return False
+    inizio = time.time()
+    try:
+        if ultima_esecuzione:
+            dal = datetime.fromtimestamp(ultima_esecuzione, tz=timezone.utc)
+            # Richiede l'indice su contatori.aggiornato_il con ambito "gruppo di raccolte"
+            # (firestore.indexes.json, da pubblicare con: firebase deploy --only firestore:indexes)
+            shard_cambiati = db.collection_group("contatori").where("aggiornato_il", ">", dal).stream()
+            uids = {shard.reference.parent.parent.id for shard in shard_cambiati}
+        else:
+            # Prima esecuzione: anche gli utenti con i soli punti precedenti agli shard
+            uids = {doc.id for doc in db.collection("utenti").select([]).stream()}
+        citta_toccate = set()
+        batch, operazioni = db.batch(), 0
+        for uid in uids:
+            utente_ref = db.collection("utenti").document(uid)
+            profilo = utente_ref.get().to_dict()
+            if profilo is None: continue
+            punti, segnalazioni, per_citta, _ = totali_utente(db, uid, profilo)
+            citta_toccate.update(per_citta)
+            batch.update(utente_ref, {"punti_totali": punti, "numero_segnalazioni_totali": segnalazioni, "punti_citta_totali": per_citta})
+            operazioni += 1
+            if operazioni == 400:
+                batch.commit()
+                batch, operazioni = db.batch(), 0
+        if operazioni:
+            batch.commit()
+        utenti = db.collection("utenti")
+        _scrivi_classifica(db, None, utenti.order_by("punti_totali", direction=firestore.Query.DESCENDING), "punti_totali")
+        for citta in citta_toccate:
+            campo = firestore.FieldPath("punti_citta_totali", citta).to_api_repr()
+            _scrivi_classifica(db, citta, utenti.order_by(campo, direction=firestore.Query.DESCENDING), "punti_citta_totali")
+        db.collection(COLLEZIONE_CLASSIFICHE).document("_blocco").set({"fino_a": 0, "ultima_esecuzione": inizio})
+    except Exception:
+        # Libera il blocco ma non avanza ultima_esecuzione: la prossima esecuzione ripete il lavoro
+        db.collection(COLLEZIONE_CLASSIFICHE).document("_blocco").set({"fino_a": 0}, merge=True)
+        raise
+    return True
+
+
+def leggi_classifica(db, citta=None):
+    doc = db.collection(COLLEZIONE_CLASSIFICHE).document(id_classifica(citta)).get()
+    return doc.to_dict() if doc.exists else None
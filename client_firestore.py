@@ -0,0 +1,36 @@
+"""
+Client Firestore dell'app Firebase predefinita, condiviso da app, script e benchmark.
+
+Con FIRESTORE_EMULATOR_HOST impostato si usa l'emulatore senza credenziali;
+altrimenti le credenziali del service account arrivano da chi chiama
+(st.secrets per l'app, .streamlit/secrets.toml per gli script). firebase_admin
+si importa solo qui dentro, alla prima connessione.
+"""
+import os
+import tomllib
+
+PROGETTO_EMULATORE = "demo-carburanti"
+
+
+def crea_client_firestore(leggi_credenziali):
+    """leggi_credenziali() restituisce la sezione firebase_credentials; con l'emulatore non viene chiamata."""
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+    if not firebase_admin._apps:
+        if os.environ.get("FIRESTORE_EMULATOR_HOST"):
+            # Sviluppo locale e benchmark: l'emulatore non controlla le credenziali
+            firebase_admin.initialize_app(credentials.AnonymousCredentials(),
+                                          {"projectId": os.environ.get("GCLOUD_PROJECT", PROGETTO_EMULATORE)})
+        else:
+            firebase_creds_dict = dict(leggi_credenziali())
+            firebase_creds_dict["private_key"] = firebase_creds_dict["private_key"].replace('\\n', '\n')
+            firebase_admin.initialize_app(credentials.Certificate(firebase_creds_dict))
+    return firestore.client()
+
+
+def connetti_firestore(percorso_segreti):
+    """Per gli script da riga di comando: le credenziali stanno nello stesso file dei segreti dell'app."""
+    def leggi_credenziali():
+        with open(percorso_segreti, "rb") as f:
+            return tomllib.load(f)["firebase_credentials"]
+    return crea_client_firestore(leggi_credenziali)
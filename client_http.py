@@ -0,0 +1,150 @@
+"""
+Client HTTP condiviso da tutto il processo per le chiamate a Google e a Identity Toolkit.
+
+Riusa le connessioni (keep-alive), applica un timeout per endpoint, ripete con
+backoff esponenziale le risposte 429/5xx, apre un circuito dopo troppi errori
+consecutivi e registra un istogramma delle latenze per endpoint.
+"""
+import bisect
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# (connessione, lettura) in secondi
+TIMEOUT_PREDEFINITO = (3.05, 10)
+TIMEOUT_PER_ENDPOINT = {
+    "places": (3.05, 10),
+    "identity_signup": (3.05, 10),
+    "identity_signin": (3.05, 10),
+    "identity_oob": (3.05, 5),
+    "identity_delete": (3.05, 10),
+    # I CSV del MIMIT sono grandi e arrivano in streaming
+    "mimit": (5, 60),
+}
+STATI_DA_RIPETERE = {429, 500, 502, 503, 504}
+# Con questi stati la richiesta non è stata eseguita, quindi si può ripetere anche una POST
+STATI_SICURI_PER_POST = {429, 503}
+TENTATIVI = 3
+BACKOFF_SECONDI = 0.5
+SOGLIA_CIRCUITO = 5
+PAUSA_CIRCUITO_SECONDI = 30
+# Estremi superiori dei secchi dell'istogramma, in millisecondi (l'ultimo raccoglie anche tutto il resto)
+SECCHI_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 60000]
+
+
+class CircuitoAperto(requests.exceptions.ConnectionError):
+    """Sollevata senza contattare il server quando l'endpoint ha fallito troppe volte di fila."""
+
+
+class _StatoEndpoint:
+    def __init__(self):
+        self.secchi = [0] * len(SECCHI_MS)
+        self.richieste = 0
+        self.errori = 0
+        self.ripetizioni = 0
+        self.errori_consecutivi = 0
+        self.aperto_fino_a = 0.0
+
+    def percentile(self, quantile):
+        if not self.richieste: return None
+        soglia = quantile * sum(self.secchi)
+        cumulato = 0
+        for limite, conteggio in zip(SECCHI_MS, self.secchi):
+            cumulato += conteggio
+            if cumulato >= soglia:
+                return limite
+        return SECCHI_MS[-1]
+
+
+class ClientHttp:
+    def __init__(self, dimensione_pool=20, tentativi=TENTATIVI, backoff_secondi=BACKOFF_SECONDI,
+                 soglia_circuito=SOGLIA_CIRCUITO, pausa_circuito_secondi=PAUSA_CIRCUITO_SECONDI):
+        self.tentativi = tentativi
+        self.backoff_secondi = backoff_secondi
+        self.soglia_circuito = soglia_circuito
+        self.pausa_circuito_secondi = pausa_circuito_secondi
+        self._sessione = requests.Session()
+        # I tentativi li gestiamo noi, l'adapter serve solo per il pool di connessioni
+        adapter = HTTPAdapter(pool_connections=dimensione_pool, pool_maxsize=dimensione_pool, max_retries=0)
+        self._sessione.mount("https://", adapter)
+        self._sessione.mount("http://", adapter)
+        self._stati = {}
+        self._lock = threading.Lock()
+
+    def _stato(self, endpoint):
+        with self._lock:
+            return self._stati.setdefault(endpoint, _StatoEndpoint())
+
+    def _registra(self, stato, durata_ms, fallita):
+        with self._lock:
+            stato.richieste += 1
+            stato.secchi[min(bisect.bisect_left(SECCHI_MS, durata_ms), len(SECCHI_MS) - 1)] += 1
+            if fallita:
+                stato.errori += 1
+                stato.errori_consecutivi += 1
+                if stato.errori_consecutivi >= self.soglia_circuito:
+                    stato.aperto_fino_a = time.monotonic() + self.pausa_circuito_secondi
+            else:
+                stato.errori_consecutivi = 0
+
+    def richiesta(self, endpoint, metodo, url, **kwargs):
+        stato = self._stato(endpoint)
+        if stato.aperto_fino_a > time.monotonic():
+            raise CircuitoAperto(f"Circuito aperto per '{endpoint}': troppi errori consecutivi")
+        kwargs.setdefault("timeout", TIMEOUT_PER_ENDPOINT.get(endpoint, TIMEOUT_PREDEFINITO))
+        stati_ripetibili = STATI_DA_RIPETERE if metodo.upper() == "GET" else STATI_SICURI_PER_POST
+        for tentativo in range(self.tentativi):
+            if tentativo:
+                with self._lock:
+                    stato.ripetizioni += 1
+                # Backoff esponenziale con jitter
+                time.sleep(self.backoff_secondi * (2 ** (tentativo - 1)) * (0.5 + random.random()))
+            inizio = time.perf_counter()
+            try:
+                response = self._sessione.request(metodo, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                self._registra(stato, (time.perf_counter() - inizio) * 1000, fallita=True)
+                if tentativo == self.tentativi - 1 or metodo.upper() != "GET": raise
+                continue
+            fallita = response.status_code in STATI_DA_RIPETERE
+            self._registra(stato, (time.perf_counter() - inizio) * 1000, fallita=fallita)
+            if response.status_code not in stati_ripetibili or tentativo == self.tentativi - 1:
+                return response
+        return response
+
+    def get(self, endpoint, url, **kwargs):
+        return self.richiesta(endpoint, "GET", url, **kwargs)
+
+    def post(self, endpoint, url, **kwargs):
+        return self.richiesta(endpoint, "POST", url, **kwargs)
+
+    def statistiche(self):
+        with self._lock:
+            stati = dict(self._stati)
+        return {
+            endpoint: {
+                "richieste": stato.richieste,
+                "errori": stato.errori,
+                "ripetizioni": stato.ripetizioni,
+                "p50_ms": stato.percentile(0.5),
+                "p99_ms": stato.percentile(0.99),
+                "circuito_aperto": stato.aperto_fino_a > time.monotonic(),
+            }
+            for endpoint, stato in stati.items()
+        }
+
+
+_client = None
+_lock_client = threading.Lock()
+
+
+def get_client():
+    """Istanza unica per processo, creata al primo uso."""
+    global _client
+    with _lock_client:
+        if _client is None:
+            _client = ClientHttp()
+        return _client
@@ -0,0 +1,39 @@
+"""
+Client Firestore e risorse di lettura condivisi da tutte le sessioni.
+
+firebase_admin si importa e si inizializza alla prima chiamata di get_db, non
+all'avvio dello script: la pagina si disegna prima che serva il database.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+from client_firestore import crea_client_firestore
+
+MAX_THREAD_PREZZI = 8
+
+
+@st.cache_resource
+def _crea_client_firestore():
+    return crea_client_firestore(lambda: st.secrets["firebase_credentials"])
+
+
+def get_db():
+    # Un errore non resta in cache: il prossimo rerun riprova la connessione
+    try:
+        return _crea_client_firestore()
+    except Exception as e:
+        st.error(f"⚠️ Errore di connessione a Firebase! Assicurati di aver impostato i Segreti correttamente. Dettagli: {e}")
+        st.stop()
+
+
+# --- Conteggio delle letture Firestore ---
+def conta_letture_firestore(numero):
+    st.session_state.letture_firestore_rerun = st.session_state.get("letture_firestore_rerun", 0) + numero
+    st.session_state.letture_firestore_sessione = st.session_state.get("letture_firestore_sessione", 0) + numero
+
+
+@st.cache_resource
+def get_pool_letture():
+    # Pool condiviso da tutte le sessioni, così il numero di richieste parallele resta limitato
+    return ThreadPoolExecutor(max_workers=MAX_THREAD_PREZZI, thread_name_prefix="letture_prezzi")
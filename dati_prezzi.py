@@ -0,0 +1,229 @@
+"""
+Prezzi della community: letture con cache e ascolti in tempo reale, storico,
+segnalazioni e conferme, ricerche per area e classifiche.
+
+Il modulo porta con sé firebase_admin e numpy: app.py lo importa solo quando
+servono dati, dopo aver disegnato la pagina.
+"""
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+from area_prezzi import cerca_prezzi_in_area
+from ascolto_prezzi import GestoreAscolti
+from autenticazione import invalida_profilo_utente
+from cache_locale import CacheConScadenza
+from classifica import citta_da_indirizzo, leggi_classifica, materializza_classifiche
+from connessione import conta_letture_firestore, get_db, get_pool_letture
+from metriche import misura_fase
+from scritture_prezzi import registra_conferma, registra_prezzi
+from storico_prezzi import leggi_serie, mesi_nel_periodo
+from tabella_prezzi import TabellaPrezzi
+
+TTL_PREZZI_SECONDI = 2 * 60
+
+@st.cache_resource
+def get_cache_prezzi():
+    # Documenti di prezzi_segnalati per ID distributore ({} = nessun prezzo segnalato)
+    return CacheConScadenza(ttl_secondi=TTL_PREZZI_SECONDI, max_voci=50000)
+
+# Firestore accetta al massimo 30 valori per "in": usiamo la stessa soglia per i blocchi di get_all
+DIMENSIONE_BLOCCO_PREZZI = 30
+
+def _leggi_blocco_prezzi(db, ids_blocco):
+    # Gira anche nei thread del pool: il client arriva come argomento
+    refs = [db.collection("prezzi_segnalati").document(id_distributore) for id_distributore in ids_blocco]
+    return {doc.id: doc.to_dict() for doc in db.get_all(refs) if doc.exists}
+
+# --- Aggiornamenti in tempo reale ---
+INTERVALLO_AGGIORNAMENTI_SECONDI = 3
+
+_gestore_ascolti = None
+
+@st.cache_resource
+def get_gestore_ascolti():
+    # Un listener per blocco di distributori, condiviso da tutte le sessioni del processo
+    global _gestore_ascolti
+    _gestore_ascolti = GestoreAscolti(get_db())
+    return _gestore_ascolti
+
+def gestore_ascolti_avviato():
+    # Per la diagnostica: None se nessuna ricerca ha ancora creato il gestore (e aperto Firestore)
+    return _gestore_ascolti
+
+def get_id_sessione():
+    if "id_sessione" not in st.session_state: st.session_state.id_sessione = uuid.uuid4().hex
+    return st.session_state.id_sessione
+
+def leggi_prezzi_da_firebase(lista_distributori):
+    with misura_fase("lettura_prezzi"):
+        return _leggi_prezzi_da_firebase(lista_distributori)
+
+def _leggi_prezzi_da_firebase(lista_distributori):
+    # L'ID del documento coincide con il place_id, quindi leggiamo direttamente i riferimenti
+    ids = list(dict.fromkeys(d['id'] for d in lista_distributori if d.get('id')))
+    if not ids: return {}
+    # Se gli ascolti di questi distributori sono già pronti leggiamo dalla memoria
+    gestore = get_gestore_ascolti()
+    gestore.iscrivi(get_id_sessione(), ids)
+    st.session_state.versione_prezzi_vista = gestore.versione(ids)[0]
+    cache = get_cache_prezzi()
+    dallo_specchio = gestore.leggi(ids, gia_in_cache=cache.presenti(ids))
+    if dallo_specchio is not None:
+        return {id_distributore: dati for id_distributore, dati in dallo_specchio.items() if dati}
+    prezzi_trovati, mancanti = cache.leggi_molti(ids)
+    if mancanti:
+        conta_letture_firestore(len(mancanti))
+        blocchi = [mancanti[i:i + DIMENSIONE_BLOCCO_PREZZI] for i in range(0, len(mancanti), DIMENSIONE_BLOCCO_PREZZI)]
+        letti = {}
+        db = get_db()
+        with misura_fase("attesa_firestore"):
+            if len(blocchi) == 1:
+                letti = _leggi_blocco_prezzi(db, blocchi[0])
+            else:
+                for risultato in get_pool_letture().map(lambda blocco: _leggi_blocco_prezzi(db, blocco), blocchi):
+                    letti.update(risultato)
+        for id_distributore in mancanti:
+            # Salviamo anche i distributori senza prezzi, per non rileggerli a ogni rerun
+            dati = letti.get(id_distributore, {})
+            cache.scrivi(id_distributore, dati)
+            prezzi_trovati[id_distributore] = dati
+    return {id_distributore: dati for id_distributore, dati in prezzi_trovati.items() if dati}
+
+# --- Tabella a colonne dei risultati ---
+def get_tabella_prezzi(distributori, prezzi_community):
+    """
+    Ricostruisce la tabella solo se è cambiata la ricerca o almeno un documento
+    di prezzo: i documenti arrivano dalla cache, quindi basta confrontarne l'identità.
+    """
+    documenti = tuple(prezzi_community.get(d['id']) for d in distributori)
+    salvata = st.session_state.get("tabella_prezzi")
+    if salvata and salvata[0] is distributori and len(salvata[1]) == len(documenti) and all(a is b for a, b in zip(salvata[1], documenti)):
+        return salvata[2]
+    tabella = TabellaPrezzi(distributori, prezzi_community)
+    st.session_state.tabella_prezzi = (distributori, documenti, tabella)
+    return tabella
+
+# --- Storico dei prezzi ---
+TTL_STORICO_SECONDI = 10 * 60
+GIORNI_TENDENZA = 7
+
+@st.cache_resource
+def get_cache_storico():
+    # Serie degli ultimi GIORNI_TENDENZA giorni per (ID distributore, carburante)
+    return CacheConScadenza(ttl_secondi=TTL_STORICO_SECONDI, max_voci=50000)
+
+def leggi_storico(ids_distributori, tipo_carburante):
+    cache = get_cache_storico()
+    trovati, mancanti = cache.leggi_molti([(id_distributore, tipo_carburante) for id_distributore in ids_distributori])
+    if mancanti:
+        ids_mancanti = [id_distributore for id_distributore, _ in mancanti]
+        conta_letture_firestore(len(ids_mancanti) * len(mesi_nel_periodo(time.time() - GIORNI_TENDENZA * 86400, time.time())))
+        with misura_fase("attesa_firestore"):
+            serie_lette = leggi_serie(get_db(), ids_mancanti, tipo_carburante, GIORNI_TENDENZA)
+        for id_distributore, serie in serie_lette.items():
+            cache.scrivi((id_distributore, tipo_carburante), serie)
+            trovati[(id_distributore, tipo_carburante)] = serie
+    return {id_distributore: trovati[(id_distributore, tipo_carburante)] for id_distributore in ids_distributori}
+
+def tendenza_prezzo(serie, valore_attuale):
+    # Differenza rispetto alla media del periodo, solo se c'è almeno un altro campione
+    if serie is None or len(serie) < 2: return None
+    differenza = float(valore_attuale) - serie.media()
+    return differenza if abs(differenza) >= 0.001 else None
+
+# MODIFICA 2: Assegniamo i punti quando si salva un prezzo
+# Prezzo e punti vengono scritti nello stesso commit (vedi scritture_prezzi.py)
+def salva_prezzi(id_distributore, nome_distributore, prezzi_per_carburante, user_id, citta=None, posizione=None):
+    try:
+        with misura_fase("attesa_firestore"):
+            registra_prezzi(get_db(), id_distributore, nome_distributore, prezzi_per_carburante, user_id, citta=citta, posizione=posizione)
+        st.success(f"Grazie! Prezzo per '{nome_distributore}' aggiornato.")
+        invalida_profilo_utente()
+        get_cache_prezzi().invalida(id_distributore)
+        for tipo_carburante in prezzi_per_carburante:
+            get_cache_storico().invalida((id_distributore, tipo_carburante))
+    except Exception as e: st.error(f"Errore durante il salvataggio: {e}")
+
+# MODIFICA 3 (BONUS): Assegniamo punti anche per la conferma
+def conferma_prezzo(id_distributore, tipo_carburante, user_id, citta=None):
+    try:
+        conta_letture_firestore(1)
+        with misura_fase("attesa_firestore"):
+            registrata = registra_conferma(get_db(), id_distributore, tipo_carburante, user_id, citta=citta)
+        if registrata:
+            st.success("Grazie per la tua conferma!")
+            invalida_profilo_utente()
+        else:
+            st.warning("Hai già confermato questo prezzo.")
+        get_cache_prezzi().invalida(id_distributore)
+    except Exception as e:
+        st.error(f"Errore durante la conferma: {e}")
+
+# --- Prezzi per area ---
+TTL_AREE_SECONDI = 60
+
+@st.cache_resource
+def get_cache_aree():
+    return CacheConScadenza(ttl_secondi=TTL_AREE_SECONDI, max_voci=1000)
+
+def cerca_piu_economici(lat, lon, raggio_km, tipo_carburante):
+    # Interroga prezzi_segnalati per geohash, senza passare da Google Places
+    chiave = (round(lat, 3), round(lon, 3), raggio_km, tipo_carburante)
+    cache = get_cache_aree()
+    risultati = cache.leggi(chiave)
+    if risultati is None:
+        with misura_fase("attesa_firestore"):
+            risultati = cerca_prezzi_in_area(get_db(), lat, lon, raggio_km * 1000, tipo_carburante, pool=get_pool_letture(),
+                                             conta_letture=conta_letture_firestore)
+        cache.scrivi(chiave, risultati)
+    return risultati
+
+# --- Classifiche ---
+TTL_CLASSIFICHE_SECONDI = 60
+INTERVALLO_CLASSIFICHE_SECONDI = 10 * 60
+
+@st.cache_resource
+def get_cache_classifiche():
+    return CacheConScadenza(ttl_secondi=TTL_CLASSIFICHE_SECONDI, max_voci=500)
+
+@st.cache_resource
+def get_stato_materializzazione():
+    # Al massimo un ricalcolo in corso per processo; tra processi decide il blocco su Firestore
+    return {"pool": ThreadPoolExecutor(max_workers=1, thread_name_prefix="classifiche"), "futuro": None, "ultimo_errore": None}
+
+def avvia_materializzazione():
+    stato = get_stato_materializzazione()
+    futuro = stato["futuro"]
+    if futuro is None or futuro.done():
+        # Senza questo l'errore del ricalcolo precedente (es. indice mancante) resterebbe nel future
+        if futuro is not None:
+            errore = futuro.exception()
+            stato["ultimo_errore"] = f"{type(errore).__name__}: {errore}" if errore else None
+        stato["futuro"] = stato["pool"].submit(materializza_classifiche, get_db())
+
+def errore_materializzazione():
+    return get_stato_materializzazione()["ultimo_errore"]
+
+def get_classifica(citta=None):
+    cache = get_cache_classifiche()
+    classifica = cache.leggi(citta)
+    if classifica is None:
+        conta_letture_firestore(1)
+        with misura_fase("attesa_firestore"):
+            classifica = leggi_classifica(get_db(), citta) or {}
+        cache.scrivi(citta, classifica)
+        aggiornata_il = classifica.get("aggiornata_il")
+        if aggiornata_il is None or aggiornata_il.timestamp() < time.time() - INTERVALLO_CLASSIFICHE_SECONDI:
+            avvia_materializzazione()
+    return classifica
+
+def citta_ricerca_corrente():
+    chiave = st.session_state.get("chiave_ricerca_corrente")
+    return chiave[1].title() if chiave and chiave[0] == "citta" else None
+
+def citta_segnalazione(distributore):
+    # La città cercata è più affidabile dell'indirizzo di Google
+    return citta_ricerca_corrente() or citta_da_indirizzo(distributore.get('indirizzo'))
@@ -0,0 +1,247 @@
+"""
+Importa i prezzi ufficiali del MIMIT (Osservaprezzi carburanti) in prezzi_segnalati.
+
+Legge in streaming anagrafica_impianti_attivi.csv e prezzo_alle_8.csv, associa
+ogni impianto al place_id di Google già presente nell'indice locale (distanza e
+somiglianza del nome), confronta i prezzi con l'importazione precedente e scrive
+su Firestore solo quelli cambiati, a blocchi, con un pool di thread.
+
+Uso:
+    python importa_mimit.py --anagrafica anagrafica_impianti_attivi.csv --prezzi prezzo_alle_8.csv
+    python importa_mimit.py --anagrafica https://www.mimit.gov.it/images/exportCSV/anagrafica_impianti_attivi.csv \\
+                            --prezzi https://www.mimit.gov.it/images/exportCSV/prezzo_alle_8.csv --prova
+
+Con FIRESTORE_EMULATOR_HOST impostato scrive sull'emulatore, altrimenti usa le
+credenziali di .streamlit/secrets.toml come l'app.
+"""
+import argparse
+import csv
+import io
+import re
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from difflib import SequenceMatcher
+from zoneinfo import ZoneInfo
+
+from firebase_admin import firestore
+
+from area_prezzi import campi_geohash
+from client_firestore import connetti_firestore
+from client_http import get_client
+from indice_stazioni import PERCORSO_INDICE_STAZIONI, IndiceStazioni, distanza_m
+from storico_prezzi import MASCHERA_PREZZO, aggiungi_al_batch, in_millesimi
+
+DIMENSIONE_BLOCCO_CSV = 2000
+# Un WriteBatch accetta al massimo 500 operazioni
+OPERAZIONI_PER_BATCH = 450
+THREAD_SCRITTURA = 8
+# Associazione impianto -> place_id
+RAGGIO_ASSOCIAZIONE_M = 150
+DISTANZA_SICURA_M = 40
+SOMIGLIANZA_MINIMA = 0.45
+CARBURANTI = {"benzina": "Benzina", "gasolio": "Gasolio", "gpl": "GPL", "metano": "Metano"}
+SEGNALATO_DA = "mimit"
+# dtComu è in ora italiana
+FUSO_MIMIT = ZoneInfo("Europe/Rome")
+
+
+# --- Lettura dei CSV ---
+def righe_csv(sorgente):
+    """Righe del CSV come dizionari, senza caricare il file in memoria. Accetta un percorso o un URL."""
+    if sorgente.startswith(("http://", "https://")):
+        response = get_client().get("mimit", sorgente, stream=True)
+        response.raise_for_status()
+        response.raw.decode_content = True
+        testo = io.TextIOWrapper(response.raw, encoding="utf-8", errors="replace", newline="")
+    else:
+        testo = open(sorgente, encoding="utf-8", errors="replace", newline="")
+    with testo:
+        prima = testo.readline()
+        # I file del MIMIT iniziano con una riga "Estrazione del ..." prima dell'intestazione
+        intestazione = testo.readline() if prima.startswith("Estrazione") else prima
+        separatore = "|" if intestazione.count("|") > intestazione.count(";") else ";"
+        campi = [c.strip() for c in intestazione.strip().split(separatore)]
+        for riga in csv.reader(testo, delimiter=separatore):
+            if len(riga) >= len(campi):
+                yield dict(zip(campi, (valore.strip() for valore in riga)))
+
+
+def a_blocchi(iterabile, dimensione):
+    blocco = []
+    for elemento in iterabile:
+        blocco.append(elemento)
+        if len(blocco) == dimensione:
+            yield blocco
+            blocco = []
+    if blocco:
+        yield blocco
+
+
+def _numero(testo):
+    try:
+        return float(testo.replace(",", "."))
+    except (AttributeError, ValueError):
+        return None
+
+
+def _data_comunicazione(testo):
+    for formato in ("%d/%m/%Y %H:%M:%S", "%Y-%m-%d %H:%M:%S"):
+        try:
+            return datetime.strptime(testo, formato).replace(tzinfo=FUSO_MIMIT)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def _normalizza_nome(testo):
+    return " ".join(re.sub(r"[^a-z0-9 ]", " ", (testo or "").lower()).split())
+
+
+# --- Associazione impianti -> place_id ---
+def associa_impianti(righe_anagrafica, indice):
+    """Restituisce {idImpianto: (place_id, nome Google, lat, lon)} per gli impianti riconosciuti."""
+    associazioni = {}
+    for blocco in a_blocchi(righe_anagrafica, DIMENSIONE_BLOCCO_CSV):
+        for impianto in blocco:
+            lat, lon = _numero(impianto.get("Latitudine")), _numero(impianto.get("Longitudine"))
+            if lat is None or lon is None: continue
+            nome_mimit = _normalizza_nome(" ".join(impianto.get(c, "") for c in ("Bandiera", "Nome Impianto", "Gestore")))
+            migliore, punteggio_migliore = None, 0.0
+            for candidato in indice.cerca_nel_raggio(lat, lon, RAGGIO_ASSOCIAZIONE_M):
+                distanza = distanza_m(lat, lon, float(candidato["latitudine"]), float(candidato["longitudine"]))
+                somiglianza = SequenceMatcher(None, nome_mimit, _normalizza_nome(candidato["nome"])).ratio()
+                if distanza > DISTANZA_SICURA_M and somiglianza < SOMIGLIANZA_MINIMA: continue
+                # I candidati vicini e con nome simile vincono su quelli solo vicini
+                punteggio = somiglianza + (1 - distanza / RAGGIO_ASSOCIAZIONE_M)
+                if punteggio > punteggio_migliore:
+                    migliore, punteggio_migliore = candidato, punteggio
+            if migliore:
+                associazioni[impianto["idImpianto"]] = (migliore["id"], migliore["nome"], float(migliore["latitudine"]), float(migliore["longitudine"]))
+    return associazioni
+
+
+def leggi_prezzi_mimit(righe_prezzi, associazioni):
+    """{(place_id, carburante): (millesimi, data)} preferendo il self service al servito."""
+    prezzi, self_service = {}, {}
+    for riga in righe_prezzi:
+        associazione = associazioni.get(riga.get("idImpianto"))
+        carburante = CARBURANTI.get(riga.get("descCarburante", "").strip().lower())
+        prezzo = _numero(riga.get("prezzo"))
+        if not associazione or not carburante or not prezzo: continue
+        # Righe con prezzi assurdi (es. in millesimi) non entrerebbero nello storico
+        if in_millesimi(prezzo) > MASCHERA_PREZZO: continue
+        chiave = (associazione[0], carburante)
+        is_self = riga.get("isSelf") == "1"
+        if chiave in prezzi and self_service[chiave] and not is_self: continue
+        prezzi[chiave] = (in_millesimi(prezzo), _data_comunicazione(riga.get("dtComu")))
+        self_service[chiave] = is_self
+    return prezzi
+
+
+# --- Confronto con l'importazione precedente ---
+class StatoImportazione:
+    """Ultimi prezzi importati, nello stesso file SQLite dell'indice."""
+
+    def __init__(self, percorso):
+        self._conn = sqlite3.connect(percorso)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS mimit_prezzi ("
+                " place_id TEXT NOT NULL, carburante TEXT NOT NULL, millesimi INTEGER NOT NULL,"
+                " PRIMARY KEY (place_id, carburante))"
+            )
+
+    def cambiati(self, prezzi):
+        precedenti = {(p, c): m for p, c, m in self._conn.execute("SELECT place_id, carburante, millesimi FROM mimit_prezzi")}
+        return {chiave: valore for chiave, valore in prezzi.items() if precedenti.get(chiave) != valore[0]}
+
+    def salva(self, prezzi):
+        with self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO mimit_prezzi VALUES (?, ?, ?)",
+                                   [(p, c, valore[0]) for (p, c), valore in prezzi.items()])
+
+
+# --- Scrittura su Firestore ---
+def blocchi_di_scrittura(cambiati, distributori):
+    """Raggruppa i prezzi per distributore e poi in blocchi che stanno in un WriteBatch."""
+    per_distributore = {}
+    for (place_id, carburante), valore in cambiati.items():
+        per_distributore.setdefault(place_id, {})[carburante] = valore
+    blocco, operazioni = [], 0
+    for place_id, prezzi in per_distributore.items():
+        # Un set sul documento dei prezzi più un'aggiunta allo storico per carburante
+        costo = 1 + len(prezzi)
+        if operazioni + costo > OPERAZIONI_PER_BATCH:
+            yield blocco
+            blocco, operazioni = [], 0
+        blocco.append((place_id, distributori[place_id], prezzi))
+        operazioni += costo
+    if blocco:
+        yield blocco
+
+
+def scrivi_blocco(db, blocco):
+    batch = db.batch()
+    for place_id, (nome, lat, lon), prezzi in blocco:
+        voci = {}
+        for carburante, (millesimi, data) in prezzi.items():
+            voci[carburante] = {
+                "valore": millesimi / 1000, "conferme": 1, "segnalato_da": [SEGNALATO_DA],
+                "data_inserimento": data or firestore.SERVER_TIMESTAMP, "fonte": "mimit",
+            }
+            istante = data.timestamp() if data else None
+            aggiungi_al_batch(db, batch, place_id, carburante, millesimi / 1000, istante)
+        batch.set(db.collection("prezzi_segnalati").document(place_id),
+                  {"id": place_id, "nome_distributore": nome, "prezzi": voci, "ultimo_aggiornamento": firestore.SERVER_TIMESTAMP, **campi_geohash(lat, lon)},
+                  merge=True)
+    batch.commit()
+    return blocco
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--anagrafica", required=True, help="percorso o URL di anagrafica_impianti_attivi.csv")
+    parser.add_argument("--prezzi", required=True, help="percorso o URL di prezzo_alle_8.csv")
+    parser.add_argument("--indice", default=PERCORSO_INDICE_STAZIONI, help="file SQLite dell'indice dei distributori")
+    parser.add_argument("--segreti", default=".streamlit/secrets.toml")
+    parser.add_argument("--thread", type=int, default=THREAD_SCRITTURA)
+    parser.add_argument("--prova", action="store_true", help="calcola le differenze senza scrivere su Firestore")
+    args = parser.parse_args()
+
+    inizio = time.perf_counter()
+    indice = IndiceStazioni(args.indice)
+    associazioni = associa_impianti(righe_csv(args.anagrafica), indice)
+    print(f"Impianti associati a un place_id: {len(associazioni)} ({time.perf_counter() - inizio:.1f} s)")
+
+    prezzi = leggi_prezzi_mimit(righe_csv(args.prezzi), associazioni)
+    stato = StatoImportazione(args.indice)
+    cambiati = stato.cambiati(prezzi)
+    print(f"Prezzi letti: {len(prezzi)}, cambiati rispetto all'importazione precedente: {len(cambiati)}")
+    if args.prova or not cambiati:
+        return 0
+
+    db = connetti_firestore(args.segreti)
+    distributori = {place_id: (nome, lat, lon) for place_id, nome, lat, lon in associazioni.values()}
+    scritti, errori = 0, 0
+    with ThreadPoolExecutor(max_workers=args.thread) as pool:
+        futuri = [pool.submit(scrivi_blocco, db, blocco) for blocco in blocchi_di_scrittura(cambiati, distributori)]
+        for futuro in as_completed(futuri):
+            try:
+                blocco = futuro.result()
+            except Exception as e:
+                errori += 1
+                print(f"Errore in un blocco di scrittura: {e}", file=sys.stderr)
+                continue
+            # Lo stato avanza solo per i blocchi scritti: gli altri si riprovano alla prossima esecuzione
+            salvati = {(place_id, c): v for place_id, _, p in blocco for c, v in p.items()}
+            stato.salva(salvati)
+            scritti += len(salvati)
+    print(f"Prezzi scritti: {scritti}, blocchi falliti: {errori} ({time.perf_counter() - inizio:.1f} s)")
+    return 1 if errori else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
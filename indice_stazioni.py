@@ -0,0 +1,180 @@
+"""
+Indice geografico persistente dei distributori già visti, su SQLite.
+
+Lo spazio è diviso in celle geohash: una cella "fresca" è stata interrogata su
+Google Places di recente, quindi le ricerche che cadono su celle fresche si
+possono servire dall'indice senza chiamare Google.
+"""
+import math
+import sqlite3
+import threading
+import time
+
+BASE32_GEOHASH = "0123456789bcdefghjkmnpqrstuvwxyz"
+RAGGIO_TERRA_M = 6371000
+# Relativo alla cartella di lavoro: lo stesso file per l'app e per gli script di importazione
+PERCORSO_INDICE_STAZIONI = "indice_stazioni.sqlite3"
+
+
+# --- Geohash ---
+def geohash_codifica(lat, lon, precisione):
+    lat_min, lat_max, lon_min, lon_max = -90.0, 90.0, -180.0, 180.0
+    codice, bit, valore, pari = [], 0, 0, True
+    while len(codice) < precisione:
+        if pari:
+            meta = (lon_min + lon_max) / 2
+            if lon >= meta:
+                valore, lon_min = (valore << 1) | 1, meta
+            else:
+                valore, lon_max = valore << 1, meta
+        else:
+            meta = (lat_min + lat_max) / 2
+            if lat >= meta:
+                valore, lat_min = (valore << 1) | 1, meta
+            else:
+                valore, lat_max = valore << 1, meta
+        pari = not pari
+        bit += 1
+        if bit == 5:
+            codice.append(BASE32_GEOHASH[valore])
+            bit, valore = 0, 0
+    return "".join(codice)
+
+
+def geohash_riquadro(cella):
+    """Restituisce (lat_min, lat_max, lon_min, lon_max) della cella."""
+    lat_min, lat_max, lon_min, lon_max = -90.0, 90.0, -180.0, 180.0
+    pari = True
+    for carattere in cella:
+        valore = BASE32_GEOHASH.index(carattere)
+        for spostamento in range(4, -1, -1):
+            bit = (valore >> spostamento) & 1
+            if pari:
+                meta = (lon_min + lon_max) / 2
+                if bit: lon_min = meta
+                else: lon_max = meta
+            else:
+                meta = (lat_min + lat_max) / 2
+                if bit: lat_min = meta
+                else: lat_max = meta
+            pari = not pari
+    return lat_min, lat_max, lon_min, lon_max
+
+
+def geohash_centro(cella):
+    lat_min, lat_max, lon_min, lon_max = geohash_riquadro(cella)
+    return (lat_min + lat_max) / 2, (lon_min + lon_max) / 2
+
+
+def distanza_m(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi, d_lambda = phi2 - phi1, math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * RAGGIO_TERRA_M * math.asin(math.sqrt(a))
+
+
+def riquadro_per_raggio(lat, lon, raggio_m):
+    d_lat = math.degrees(raggio_m / RAGGIO_TERRA_M)
+    d_lon = math.degrees(raggio_m / (RAGGIO_TERRA_M * max(math.cos(math.radians(lat)), 1e-6)))
+    return lat - d_lat, lat + d_lat, lon - d_lon, lon + d_lon
+
+
+def celle_per_raggio(lat, lon, raggio_m, precisione):
+    """Celle geohash che coprono il cerchio (approssimato con il suo riquadro)."""
+    lat_min, lat_max, lon_min, lon_max = riquadro_per_raggio(lat, lon, raggio_m)
+    c_lat_min, c_lat_max, c_lon_min, c_lon_max = geohash_riquadro(geohash_codifica(lat, lon, precisione))
+    # Campioniamo con passo pari a metà cella, così nessuna cella intermedia viene saltata
+    passo_lat, passo_lon = (c_lat_max - c_lat_min) / 2, (c_lon_max - c_lon_min) / 2
+    celle = set()
+    p_lat = lat_min
+    while True:
+        p_lon = lon_min
+        while True:
+            celle.add(geohash_codifica(min(p_lat, lat_max), min(p_lon, lon_max), precisione))
+            if p_lon >= lon_max: break
+            p_lon += passo_lon
+        if p_lat >= lat_max: break
+        p_lat += passo_lat
+    return sorted(celle)
+
+
+def raggio_cella_m(cella):
+    """Raggio del cerchio circoscritto alla cella, usato per interrogarla su Google."""
+    lat_min, lat_max, lon_min, lon_max = geohash_riquadro(cella)
+    lat_c, lon_c = geohash_centro(cella)
+    return distanza_m(lat_c, lon_c, lat_max, lon_max)
+
+
+# --- Indice su SQLite ---
+class IndiceStazioni:
+    def __init__(self, percorso, precisione_celle=5):
+        self.precisione_celle = precisione_celle
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(percorso, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS stazioni ("
+                " id TEXT PRIMARY KEY, nome TEXT, indirizzo TEXT,"
+                " lat REAL NOT NULL, lon REAL NOT NULL, cella TEXT NOT NULL, aggiornata_il REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS stazioni_lat_lon ON stazioni (lat, lon)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS celle (cella TEXT PRIMARY KEY, aggiornata_il REAL NOT NULL)")
+
+    def aggiorna_stazioni(self, stazioni):
+        """Inserisce o aggiorna distributori nel formato usato dall'app (lat/lon come stringhe)."""
+        adesso = time.time()
+        righe = []
+        for s in stazioni:
+            if not s.get("id"): continue
+            lat, lon = float(s["latitudine"]), float(s["longitudine"])
+            righe.append((s["id"], s.get("nome", "N/D"), s.get("indirizzo", "N/D"), lat, lon,
+                          geohash_codifica(lat, lon, self.precisione_celle), adesso))
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO stazioni VALUES (?, ?, ?, ?, ?, ?, ?)", righe)
+
+    def segna_celle_aggiornate(self, celle):
+        adesso = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO celle VALUES (?, ?)", [(c, adesso) for c in celle])
+
+    def celle_da_aggiornare(self, celle, eta_max_secondi):
+        """Celle mai interrogate o interrogate da più di eta_max_secondi."""
+        limite = time.time() - eta_max_secondi
+        segnaposto = ",".join("?" * len(celle))
+        with self._lock:
+            fresche = {riga[0] for riga in self._conn.execute(
+                f"SELECT cella FROM celle WHERE aggiornata_il >= ? AND cella IN ({segnaposto})", [limite, *celle])}
+        return [c for c in celle if c not in fresche]
+
+    def cerca_nel_raggio(self, lat, lon, raggio_m):
+        """Distributori entro raggio_m, dal più vicino."""
+        lat_min, lat_max, lon_min, lon_max = riquadro_per_raggio(lat, lon, raggio_m)
+        with self._lock:
+            righe = self._conn.execute(
+                "SELECT id, nome, indirizzo, lat, lon FROM stazioni WHERE lat BETWEEN ? AND ? AND lon BETWEEN ? AND ?",
+                (lat_min, lat_max, lon_min, lon_max)).fetchall()
+        trovati = []
+        for id_distributore, nome, indirizzo, s_lat, s_lon in righe:
+            distanza = distanza_m(lat, lon, s_lat, s_lon)
+            if distanza <= raggio_m:
+                trovati.append((distanza, {"id": id_distributore, "nome": nome, "indirizzo": indirizzo,
+                                           "latitudine": str(s_lat), "longitudine": str(s_lon)}))
+        trovati.sort(key=lambda t: t[0])
+        return [s for _, s in trovati]
+
+    def posizioni(self, ids):
+        """{id: (lat, lon)} per gli ID presenti nell'indice."""
+        trovate = {}
+        ids = list(ids)
+        for i in range(0, len(ids), 500):
+            blocco = ids[i:i + 500]
+            with self._lock:
+                righe = self._conn.execute(
+                    f"SELECT id, lat, lon FROM stazioni WHERE id IN ({','.join('?' * len(blocco))})", blocco).fetchall()
+            trovate.update({id_distributore: (lat, lon) for id_distributore, lat, lon in righe})
+        return trovate
+
+    def conta_stazioni(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM stazioni").fetchone()[0]
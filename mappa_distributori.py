@@ -0,0 +1,59 @@
+"""
+Mappa dei distributori con un unico livello FastMarkerCluster.
+
+I marker viaggiano come una lista di righe [lat, lon, popup, colore] disegnate
+lato browser, invece di un oggetto folium.Marker per distributore. Il livello si
+può sostituire da solo quando cambiano i prezzi, tenendo la mappa di base.
+"""
+import html
+import json
+
+import folium
+from folium.plugins import FastMarkerCluster
+
+TILES_GOOGLE = "https://mt1.google.com/vt/lyrs=m&x={x}&y={y}&z={z}"
+
+CALLBACK_MARKER = """
+function (riga) {
+    var icona = L.AwesomeMarkers.icon({icon: "gas-pump", prefix: "fa", markerColor: riga[3]});
+    var marker = L.marker(new L.LatLng(riga[0], riga[1]), {icon: icona});
+    marker.bindPopup(riga[2]);
+    return marker;
+};
+"""
+
+
+def crea_mappa_base(centro, zoom):
+    return folium.Map(location=centro, zoom_start=zoom, tiles=TILES_GOOGLE, attr="Google")
+
+
+def righe_marker(lista_distributori, prezzi_db, user_location=None):
+    righe = []
+    for distributore in lista_distributori:
+        lat, lon = float(distributore["latitudine"]), float(distributore["longitudine"])
+        info_prezzi_db = prezzi_db.get(distributore.get('id'), {})
+        testo_prezzi = ""
+        for carburante, info_carburante in info_prezzi_db.get('prezzi', {}).items():
+            prezzo_val = info_carburante.get('valore', 'N/D'); conferme_val = info_carburante.get('conferme', 0)
+            testo_prezzi += f"<br><b>{html.escape(carburante)}: {prezzo_val} €</b> ({conferme_val} conferme)"
+        popup_html = f"<strong>{html.escape(distributore['nome'])}</strong><br>{html.escape(distributore['indirizzo'])}{testo_prezzi}"
+        if user_location:
+            link_navigatore = f"https://www.google.com/maps/dir/?api=1&origin={user_location['latitude']},{user_location['longitude']}&destination={lat},{lon}"
+            popup_html += f"<br><br><a href='{link_navigatore}' target='_blank'>➡️ Avvia Navigatore</a>"
+        righe.append([lat, lon, popup_html, "green" if testo_prezzi else "blue"])
+    return righe
+
+
+def aggiungi_distributori_sulla_mappa(mappa_da_popolare, righe):
+    """Aggiunge il livello dei marker e lo restituisce, per poterlo sostituire in seguito."""
+    return FastMarkerCluster(data=righe, callback=CALLBACK_MARKER).add_to(mappa_da_popolare)
+
+
+def sostituisci_livello(mappa, livello_vecchio, righe):
+    mappa._children.pop(livello_vecchio.get_name(), None)
+    return aggiungi_distributori_sulla_mappa(mappa, righe)
+
+
+def dimensione_dati(righe):
+    """Byte dei dati dei marker così come finiscono nell'HTML."""
+    return len(json.dumps(righe, ensure_ascii=False).encode())
@@ -0,0 +1,77 @@
+"""
+Tempi per fase delle operazioni costose dell'app, condivisi da tutto il processo.
+
+Ogni fase (chiamate a Google, lettura dei prezzi, statistiche, mappa, attese su
+Firestore) raccoglie le ultime durate; il riepilogo riporta conteggio, totale e
+percentili. Le fasi possono essere annidate: "attesa_firestore" è compresa
+anche nel tempo di "lettura_prezzi".
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+CAMPIONI_PER_FASE = 1000
+
+
+def _percentile(ordinati, quantile):
+    return round(ordinati[min(int(len(ordinati) * quantile), len(ordinati) - 1)], 2)
+
+
+class TempiFasi:
+    def __init__(self, campioni_per_fase=CAMPIONI_PER_FASE):
+        self.campioni_per_fase = campioni_per_fase
+        self._lock = threading.Lock()
+        # fase -> {"conteggio", "totale_ms", "campioni": ultime durate in ms}
+        self._fasi = {}
+
+    def registra(self, fase, durata_ms):
+        with self._lock:
+            stato = self._fasi.setdefault(fase, {"conteggio": 0, "totale_ms": 0.0, "campioni": deque(maxlen=self.campioni_per_fase)})
+            stato["conteggio"] += 1
+            stato["totale_ms"] += durata_ms
+            stato["campioni"].append(durata_ms)
+
+    @contextmanager
+    def misura(self, fase):
+        inizio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registra(fase, (time.perf_counter() - inizio) * 1000)
+
+    def riepilogo(self):
+        with self._lock:
+            fasi = {fase: (stato["conteggio"], stato["totale_ms"], sorted(stato["campioni"])) for fase, stato in self._fasi.items()}
+        return {
+            fase: {
+                "conteggio": conteggio,
+                "totale_ms": round(totale_ms, 1),
+                "p50_ms": _percentile(campioni, 0.5),
+                "p95_ms": _percentile(campioni, 0.95),
+                "massimo_ms": round(campioni[-1], 2),
+            }
+            for fase, (conteggio, totale_ms, campioni) in fasi.items()
+        }
+
+    def azzera(self):
+        with self._lock:
+            self._fasi.clear()
+
+
+_tempi = None
+_lock_tempi = threading.Lock()
+
+
+def get_tempi_fasi():
+    """Istanza unica per processo, creata al primo uso."""
+    global _tempi
+    with _lock_tempi:
+        if _tempi is None:
+            _tempi = TempiFasi()
+        return _tempi
+
+
+def misura_fase(fase):
+    """Context manager che registra la durata del blocco sotto questa fase."""
+    return get_tempi_fasi().misura(fase)
@@ -0,0 +1,49 @@
+"""
+Aggiunge geohash, latitudine e longitudine ai documenti di prezzi_segnalati che non li hanno.
+
+Le coordinate arrivano dall'indice locale dei distributori; i documenti di
+distributori mai visti restano come sono e vengono contati a fine esecuzione.
+
+Uso: python migra_geohash.py [--indice indice_stazioni.sqlite3] [--prova]
+"""
+import argparse
+import sys
+
+from area_prezzi import campi_geohash
+from client_firestore import connetti_firestore
+from indice_stazioni import PERCORSO_INDICE_STAZIONI, IndiceStazioni
+
+DOCUMENTI_PER_BATCH = 400
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--indice", default=PERCORSO_INDICE_STAZIONI, help="file SQLite dell'indice dei distributori")
+    parser.add_argument("--segreti", default=".streamlit/secrets.toml")
+    parser.add_argument("--prova", action="store_true", help="conta i documenti da migrare senza scrivere")
+    args = parser.parse_args()
+
+    db = connetti_firestore(args.segreti)
+    indice = IndiceStazioni(args.indice)
+    # Solo gli ID: i documenti con molti carburanti non servono interi
+    da_migrare = [doc.id for doc in db.collection("prezzi_segnalati").select(["geohash"]).stream()
+                  if not (doc.to_dict() or {}).get("geohash")]
+    posizioni = indice.posizioni(da_migrare)
+    print(f"Documenti senza geohash: {len(da_migrare)}, con coordinate nell'indice: {len(posizioni)}")
+    if args.prova:
+        return 0
+
+    migrati = 0
+    elementi = list(posizioni.items())
+    for i in range(0, len(elementi), DOCUMENTI_PER_BATCH):
+        batch = db.batch()
+        for id_distributore, (lat, lon) in elementi[i:i + DOCUMENTI_PER_BATCH]:
+            batch.update(db.collection("prezzi_segnalati").document(id_distributore), campi_geohash(lat, lon))
+        batch.commit()
+        migrati += len(elementi[i:i + DOCUMENTI_PER_BATCH])
+    print(f"Documenti migrati: {migrati}, senza coordinate: {len(da_migrare) - migrati}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
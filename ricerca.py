@@ -0,0 +1,204 @@
+"""
+Ricerca dei distributori su Google Places, con cache dei risultati e indice locale.
+
+Le ricerche per posizione chiamano Google una sola volta sull'intero raggio, e
+solo se una parte dell'area non è ancora nell'indice; le pagine successive dei
+risultati arrivano in background.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+from cache_locale import CacheConScadenza
+from client_http import get_client
+from indice_stazioni import PERCORSO_INDICE_STAZIONI, IndiceStazioni, celle_per_raggio, distanza_m, geohash_centro, raggio_cella_m
+from metriche import misura_fase
+
+# --- Cache dei risultati condivisa tra le sessioni ---
+TTL_RICERCHE_SECONDI = 30 * 60
+
+@st.cache_resource
+def get_cache_ricerche():
+    # Risultati di Google Places per città o posizione
+    return CacheConScadenza(ttl_secondi=TTL_RICERCHE_SECONDI, max_voci=1000)
+
+# --- Funzioni di Logica ---
+def posizione_valida(coordinate):
+    # Senza permesso, o finché il browser non ha una posizione, streamlit_geolocation restituisce latitude None
+    return bool(coordinate) and coordinate.get('latitude') is not None and coordinate.get('longitude') is not None
+
+def chiave_ricerca(citta=None, coordinate=None):
+    # Posizioni arrotondate a ~100 m: chi cerca dallo stesso punto riusa lo stesso risultato
+    if posizione_valida(coordinate):
+        return ("posizione", round(coordinate['latitude'], 3), round(coordinate['longitude'], 3))
+    if citta:
+        return ("citta", " ".join(citta.lower().split()))
+    return None
+
+# --- Indice locale dei distributori ---
+RAGGIO_RICERCA_M = 5000
+# Celle geohash di precisione 6 (~1,2 x 0,6 km) per ricordare quali zone sono già
+# nell'indice: abbastanza piccole da stare quasi tutte dentro il raggio di una ricerca
+PRECISIONE_CELLE = 6
+ETA_MAX_CELLE_SECONDI = 7 * 24 * 3600
+
+@st.cache_resource
+def get_indice_stazioni():
+    return IndiceStazioni(PERCORSO_INDICE_STAZIONI, precisione_celle=PRECISIONE_CELLE)
+
+# --- Paginazione di Google Places ---
+# Google restituisce al massimo 3 pagine da 20 risultati
+MAX_PAGINE_GOOGLE = 3
+# Il next_page_token diventa valido solo dopo qualche secondo
+RITARDO_TOKEN_SECONDI = 2
+TENTATIVI_TOKEN = 3
+
+def _url_places(metodo):
+    # Configurabile dai segreti per puntare a uno stub locale dell'API
+    return f"{st.secrets.get('google_places_url', 'https://maps.googleapis.com/maps/api/place')}/{metodo}/json"
+
+@st.cache_resource
+def get_pool_paginazione():
+    # Separato dal pool delle letture: questi lavori passano la maggior parte del tempo in attesa
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="pagine_google")
+
+@st.cache_resource
+def get_paginazioni_in_corso():
+    # chiave ricerca -> {"schede": risultati aggiornati, "completa": bool, "avviata_il": timestamp}
+    return {}
+
+def _scheda_distributore(luogo):
+    return {"id": luogo.get("place_id"), "nome": luogo.get("name", "N/D"), "indirizzo": luogo.get("vicinity", "N/D"), "latitudine": str(luogo["geometry"]["location"]["lat"]), "longitudine": str(luogo["geometry"]["location"]["lng"])}
+
+class TokenNonPronto(Exception):
+    pass
+
+def _richiedi_places(url, params):
+    # Misura ogni chiamata, comprese quelle delle pagine seguite in background
+    with misura_fase("google_places"):
+        response = get_client().get("places", url, params=params)
+    response.raise_for_status()
+    dati = response.json()
+    if dati.get("status") == "INVALID_REQUEST" and "pagetoken" in params:
+        raise TokenNonPronto()
+    # Google risponde 200 anche per chiave errata o quota esaurita
+    if dati.get("status") not in ("OK", "ZERO_RESULTS"):
+        raise RuntimeError(dati.get("error_message") or dati.get("status"))
+    return [_scheda_distributore(luogo) for luogo in dati.get("results", [])], dati.get("next_page_token")
+
+def _unisci_schede(esistenti, nuove):
+    visti = {s["id"] for s in esistenti}
+    return esistenti + [s for s in nuove if s["id"] not in visti]
+
+def _completa_paginazione(chiave, url, api_key, token_iniziali, risultati_aggiornati, ritardo, paginazioni, indice, cache):
+    """
+    Gira in background: segue i next_page_token di una o più richieste,
+    salva le nuove pagine nell'indice e pubblica i risultati aggiornati.
+    Le risorse condivise arrivano come argomenti perché il thread non ha il contesto di Streamlit.
+    """
+    # (token, pagina a cui punta, tentativi rimasti)
+    da_seguire = [(token, 2, TENTATIVI_TOKEN) for token in token_iniziali]
+    try:
+        while da_seguire:
+            time.sleep(ritardo)
+            prossimi, nuove = [], []
+            for token, pagina, tentativi in da_seguire:
+                try:
+                    schede, token_successivo = _richiedi_places(url, {"pagetoken": token, "key": api_key, "language": "it"})
+                except TokenNonPronto:
+                    if tentativi > 1: prossimi.append((token, pagina, tentativi - 1))
+                    continue
+                except Exception:
+                    continue
+                nuove.extend(schede)
+                if token_successivo and pagina < MAX_PAGINE_GOOGLE:
+                    prossimi.append((token_successivo, pagina + 1, TENTATIVI_TOKEN))
+            if nuove:
+                indice.aggiorna_stazioni(nuove)
+                schede_aggiornate = risultati_aggiornati(nuove)
+                cache.scrivi(chiave, schede_aggiornate)
+                paginazioni[chiave] = {**paginazioni[chiave], "schede": schede_aggiornate}
+            da_seguire = prossimi
+    finally:
+        paginazioni[chiave] = {**paginazioni[chiave], "completa": True}
+
+def _avvia_paginazione(chiave, url, api_key, token_iniziali, schede_iniziali, risultati_aggiornati):
+    token_iniziali = [t for t in token_iniziali if t]
+    if not token_iniziali or MAX_PAGINE_GOOGLE < 2: return
+    paginazioni = get_paginazioni_in_corso()
+    # Teniamo solo le paginazioni recenti
+    for vecchia in [k for k, v in list(paginazioni.items()) if v["completa"] and v["avviata_il"] < time.time() - 600]:
+        paginazioni.pop(vecchia, None)
+    if chiave in paginazioni and not paginazioni[chiave]["completa"]: return
+    paginazioni[chiave] = {"schede": schede_iniziali, "completa": False, "avviata_il": time.time()}
+    ritardo = st.secrets.get("google_places_ritardo_token", RITARDO_TOKEN_SECONDI)
+    get_pool_paginazione().submit(_completa_paginazione, chiave, url, api_key, token_iniziali, risultati_aggiornati, ritardo,
+                                  paginazioni, get_indice_stazioni(), get_cache_ricerche())
+
+def unisci_pagine_arrivate():
+    """Porta in session_state le pagine arrivate in background. Restituisce True se ne mancano ancora."""
+    chiave = st.session_state.get("chiave_ricerca_corrente")
+    stato = get_paginazioni_in_corso().get(chiave) if chiave else None
+    if not stato: return False
+    if len(stato["schede"]) != len(st.session_state.distributori_trovati):
+        st.session_state.distributori_trovati = stato["schede"]
+    return not stato["completa"]
+
+def _dentro_il_raggio(lat, lon, cella, raggio_m):
+    lat_c, lon_c = geohash_centro(cella)
+    return distanza_m(lat, lon, lat_c, lon_c) + raggio_cella_m(cella) <= raggio_m
+
+def _cerca_vicino(chiave, lat, lon, api_key):
+    # Se tutta l'area è già nell'indice ed è recente Google non serve; altrimenti una sola chiamata sul raggio
+    indice = get_indice_stazioni()
+    celle = celle_per_raggio(lat, lon, RAGGIO_RICERCA_M, PRECISIONE_CELLE)
+    da_aggiornare = indice.celle_da_aggiornare(celle, ETA_MAX_CELLE_SECONDI)
+    url = _url_places("nearbysearch")
+    errori, token = [], []
+    if da_aggiornare:
+        try:
+            schede, token_successivo = _richiedi_places(url, {"location": f"{lat},{lon}", "radius": RAGGIO_RICERCA_M, "type": "gas_station", "key": api_key, "language": "it"})
+            indice.aggiorna_stazioni(schede)
+            # Solo le celle tutte dentro il cerchio sono coperte: quelle sul bordo restano da aggiornare
+            indice.segna_celle_aggiornate([c for c in da_aggiornare if _dentro_il_raggio(lat, lon, c, RAGGIO_RICERCA_M)])
+            token.append(token_successivo)
+        except Exception as e:
+            errori.append(e)
+    schedario = indice.cerca_nel_raggio(lat, lon, RAGGIO_RICERCA_M)
+    _avvia_paginazione(chiave, url, api_key, token, schedario,
+                       lambda nuove: indice.cerca_nel_raggio(lat, lon, RAGGIO_RICERCA_M))
+    return schedario, errori
+
+def trova_distributori_google(citta=None, coordinate=None):
+    chiave = chiave_ricerca(citta, coordinate)
+    if chiave is None:
+        # Altrimenti unisci_pagine_arrivate riporterebbe i risultati della ricerca precedente
+        st.session_state.pop("chiave_ricerca_corrente", None)
+        return []
+    st.session_state.chiave_ricerca_corrente = chiave
+    cache = get_cache_ricerche()
+    schedario = cache.leggi(chiave)
+    if schedario is not None: return schedario
+    api_key = st.secrets["google_api_key"]
+    if chiave[0] == "posizione":
+        schedario, errori = _cerca_vicino(chiave, coordinate['latitude'], coordinate['longitude'], api_key)
+        if errori:
+            st.error(f"Errore API Google: {errori[0]}")
+        else:
+            cache.scrivi(chiave, schedario)
+        return schedario
+    url = _url_places("textsearch")
+    try:
+        schedario, token_successivo = _richiedi_places(url, {"query": f"distributori di benzina a {citta}", "key": api_key, "language": "it"})
+        get_indice_stazioni().aggiorna_stazioni(schedario)
+        cache.scrivi(chiave, schedario)
+        # La prima pagina si mostra subito, le successive si accodano man mano
+        stato = {"schede": schedario}
+        def risultati_aggiornati(nuove):
+            stato["schede"] = _unisci_schede(stato["schede"], nuove)
+            return stato["schede"]
+        _avvia_paginazione(chiave, url, api_key, [token_successivo], schedario, risultati_aggiornati)
+        return schedario
+    except Exception as e:
+        st.error(f"Errore API Google: {e}"); return []
@@ -0,0 +1,60 @@
+"""
+Scritture su prezzi_segnalati insieme ai punti dell'utente (sugli shard di classifica.py), in un unico commit.
+
+Le funzioni ricevono il client Firestore, così si possono usare anche fuori da
+Streamlit (script e benchmark contro l'emulatore).
+"""
+from firebase_admin import firestore
+
+from area_prezzi import campi_geohash
+from classifica import aggiungi_punti
+from storico_prezzi import aggiungi_al_batch
+
+PUNTI_SEGNALAZIONE = 10
+PUNTI_CONFERMA = 2
+
+
+def registra_prezzi(db, id_distributore, nome_distributore, prezzi_per_carburante, user_id, citta=None, posizione=None):
+    """
+    Salva uno o più carburanti dello stesso distributore, li aggiunge allo
+    storico e assegna i punti con un solo WriteBatch: o va tutto a buon fine
+    o non cambia niente. Con posizione=(lat, lon) il documento riceve anche il
+    geohash per le ricerche per area.
+    """
+    doc_ref = db.collection("prezzi_segnalati").document(id_distributore)
+    prezzi = {
+        tipo_carburante: {
+            "valore": valore, "conferme": 1,
+            "segnalato_da": [user_id], "data_inserimento": firestore.SERVER_TIMESTAMP
+        }
+        for tipo_carburante, valore in prezzi_per_carburante.items()
+    }
+    documento = {"id": id_distributore, "nome_distributore": nome_distributore, "prezzi": prezzi, "ultimo_aggiornamento": firestore.SERVER_TIMESTAMP}
+    if posizione:
+        documento.update(campi_geohash(*posizione))
+    batch = db.batch()
+    batch.set(doc_ref, documento, merge=True)
+    aggiungi_punti(db, batch, user_id, PUNTI_SEGNALAZIONE * len(prezzi), segnalazioni=len(prezzi), citta=citta)
+    for tipo_carburante, valore in prezzi_per_carburante.items():
+        aggiungi_al_batch(db, batch, id_distributore, tipo_carburante, valore)
+    batch.commit()
+
+
+def registra_conferma(db, id_distributore, tipo_carburante, user_id, citta=None):
+    """
+    Aggiunge la conferma e i punti nella stessa transazione.
+    Restituisce False se l'utente aveva già segnalato o confermato quel prezzo.
+    """
+    doc_ref = db.collection("prezzi_segnalati").document(id_distributore)
+
+    @firestore.transactional
+    def update_in_transaction(transaction, doc_ref):
+        snapshot = doc_ref.get(transaction=transaction)
+        dati = snapshot.to_dict()
+        if user_id in dati["prezzi"][tipo_carburante]["segnalato_da"]:
+            return False
+        transaction.update(doc_ref, {f"prezzi.{tipo_carburante}.conferme": firestore.Increment(1), f"prezzi.{tipo_carburante}.segnalato_da": firestore.ArrayUnion([user_id]), "ultimo_aggiornamento": firestore.SERVER_TIMESTAMP})
+        aggiungi_punti(db, transaction, user_id, PUNTI_CONFERMA, citta=citta)
+        return True
+
+    return update_in_transaction(db.transaction(), doc_ref)
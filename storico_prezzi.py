@@ -0,0 +1,128 @@
+"""
+Storico dei prezzi in sola aggiunta, un documento per distributore, carburante e mese.
+
+Ogni campione è un solo intero: i secondi dall'inizio del mese nei bit alti e il
+prezzo in millesimi di euro nei 20 bit bassi. Così un'aggiunta è un ArrayUnion
+che entra nello stesso batch della segnalazione, e i valori restano unici
+(due campioni uguali nello stesso secondo sono la stessa osservazione).
+"""
+import time
+from array import array
+from datetime import datetime, timezone
+
+from firebase_admin import firestore
+
+BIT_PREZZO = 20
+MASCHERA_PREZZO = (1 << BIT_PREZZO) - 1
+COLLEZIONE_STORICO = "storico_prezzi"
+# get_all accetta molti riferimenti, ma blocchi piccoli tengono basse le risposte
+DIMENSIONE_BLOCCO_LETTURE = 100
+
+
+# --- Codifica ---
+def in_millesimi(prezzo):
+    return int(round(float(prezzo) * 1000))
+
+
+def inizio_mese(istante):
+    data = datetime.fromtimestamp(istante, tz=timezone.utc)
+    return int(datetime(data.year, data.month, 1, tzinfo=timezone.utc).timestamp())
+
+
+def codice_mese(istante):
+    return datetime.fromtimestamp(istante, tz=timezone.utc).strftime("%Y%m")
+
+
+def codifica_campione(istante, prezzo):
+    millesimi = in_millesimi(prezzo)
+    # Oltre i 20 bit il prezzo finirebbe nei bit del tempo
+    if not 0 <= millesimi <= MASCHERA_PREZZO:
+        raise ValueError(f"Prezzo fuori scala per lo storico: {prezzo}")
+    return ((int(istante) - inizio_mese(istante)) << BIT_PREZZO) | millesimi
+
+
+def id_documento(id_distributore, tipo_carburante, mese):
+    return f"{id_distributore}_{tipo_carburante}_{mese}"
+
+
+def mesi_nel_periodo(inizio, fine):
+    mesi, corrente = [], inizio_mese(inizio)
+    while corrente <= fine:
+        mesi.append(codice_mese(corrente))
+        # Il giorno 32 cade sempre nel mese successivo
+        corrente = inizio_mese(corrente + 32 * 86400)
+    return mesi
+
+
+class SerieStorica:
+    """Campioni di un distributore e carburante in colonne compatte, ordinati per tempo."""
+
+    def __init__(self, tempi=None, millesimi=None):
+        self.tempi = tempi if tempi is not None else array("q")
+        self.millesimi = millesimi if millesimi is not None else array("l")
+
+    @classmethod
+    def da_documenti(cls, documenti):
+        campioni = []
+        for dati in documenti:
+            base = dati["inizio_mese"]
+            campioni.extend((base + (c >> BIT_PREZZO), c & MASCHERA_PREZZO) for c in dati.get("campioni", []))
+        campioni.sort()
+        return cls(array("q", (t for t, _ in campioni)), array("l", (m for _, m in campioni)))
+
+    def dal(self, inizio):
+        """Sottoserie dei campioni da `inizio` in poi (ricerca binaria sui tempi)."""
+        basso, alto = 0, len(self.tempi)
+        while basso < alto:
+            meta = (basso + alto) // 2
+            if self.tempi[meta] < inizio: basso = meta + 1
+            else: alto = meta
+        return SerieStorica(self.tempi[basso:], self.millesimi[basso:])
+
+    def __len__(self):
+        return len(self.tempi)
+
+    def media(self):
+        return sum(self.millesimi) / len(self.millesimi) / 1000 if self.millesimi else None
+
+
+# --- Firestore ---
+def aggiungi_al_batch(db, batch, id_distributore, tipo_carburante, prezzo, istante=None):
+    """Accoda il campione a un WriteBatch o a una Transaction già aperti."""
+    istante = int(istante if istante is not None else time.time())
+    mese = codice_mese(istante)
+    ref = db.collection(COLLEZIONE_STORICO).document(id_documento(id_distributore, tipo_carburante, mese))
+    batch.set(ref, {
+        "id": id_distributore, "carburante": tipo_carburante, "mese": mese,
+        "inizio_mese": inizio_mese(istante),
+        "campioni": firestore.ArrayUnion([codifica_campione(istante, prezzo)]),
+    }, merge=True)
+
+
+def leggi_serie(db, ids_distributori, tipo_carburante, giorni, adesso=None):
+    """Restituisce {id: SerieStorica} degli ultimi `giorni` giorni."""
+    adesso = adesso if adesso is not None else time.time()
+    inizio = adesso - giorni * 86400
+    mesi = mesi_nel_periodo(inizio, adesso)
+    refs = [db.collection(COLLEZIONE_STORICO).document(id_documento(id_distributore, tipo_carburante, mese))
+            for id_distributore in ids_distributori for mese in mesi]
+    documenti = {id_distributore: [] for id_distributore in ids_distributori}
+    for i in range(0, len(refs), DIMENSIONE_BLOCCO_LETTURE):
+        for doc in db.get_all(refs[i:i + DIMENSIONE_BLOCCO_LETTURE]):
+            if doc.exists:
+                dati = doc.to_dict()
+                documenti[dati["id"]].append(dati)
+    return {id_distributore: SerieStorica.da_documenti(docs).dal(inizio) for id_distributore, docs in documenti.items()}
+
+
+def statistiche_area(serie_per_distributore):
+    """Minimo, massimo e media (in euro) su tutti i campioni delle serie, o None se vuote."""
+    minimo, massimo, somma, numero = None, None, 0, 0
+    for serie in serie_per_distributore.values():
+        if not len(serie): continue
+        minimo = min(serie.millesimi) if minimo is None else min(minimo, min(serie.millesimi))
+        massimo = max(serie.millesimi) if massimo is None else max(massimo, max(serie.millesimi))
+        somma += sum(serie.millesimi)
+        numero += len(serie)
+    if not numero: return None
+    return {"minimo": minimo / 1000, "massimo": massimo / 1000, "media": somma / numero / 1000, "campioni": numero}
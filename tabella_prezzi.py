@@ -0,0 +1,82 @@
+"""
+Rappresentazione a colonne (NumPy) dei distributori trovati e dei loro prezzi.
+
+Si costruisce una volta per ricerca; filtri, ordinamenti e statistiche sono
+operazioni vettoriali sugli array invece di cicli sui dizionari.
+"""
+import time
+
+import numpy as np
+
+RAGGIO_TERRA_KM = 6371.0
+# Per la "convenienza": quanto carburante costa raggiungere il distributore (andata e ritorno)
+CONSUMO_LITRI_PER_KM = 0.06
+LITRI_RIFORNIMENTO = 40
+
+
+def _in_euro(valore):
+    try:
+        return float(valore)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _istante(data):
+    return data.timestamp() if hasattr(data, "timestamp") else np.nan
+
+
+class TabellaPrezzi:
+    def __init__(self, distributori, prezzi, adesso=None):
+        adesso = adesso if adesso is not None else time.time()
+        n = len(distributori)
+        self.ids = [d["id"] for d in distributori]
+        self.lat = np.fromiter((float(d["latitudine"]) for d in distributori), dtype=np.float64, count=n)
+        self.lon = np.fromiter((float(d["longitudine"]) for d in distributori), dtype=np.float64, count=n)
+        self.prezzo, self.conferme, self.eta_ore = {}, {}, {}
+        for riga, id_distributore in enumerate(self.ids):
+            for carburante, info in prezzi.get(id_distributore, {}).get("prezzi", {}).items():
+                if carburante not in self.prezzo:
+                    self.prezzo[carburante] = np.full(n, np.nan)
+                    self.conferme[carburante] = np.zeros(n, dtype=np.int32)
+                    self.eta_ore[carburante] = np.full(n, np.nan)
+                self.prezzo[carburante][riga] = _in_euro(info.get("valore"))
+                self.conferme[carburante][riga] = info.get("conferme", 0)
+                self.eta_ore[carburante][riga] = (adesso - _istante(info.get("data_inserimento"))) / 3600
+        self.carburanti = sorted(self.prezzo)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def righe_con_prezzo(self, carburante, eta_max_ore=None):
+        if carburante not in self.prezzo: return np.empty(0, dtype=np.intp)
+        valide = ~np.isnan(self.prezzo[carburante])
+        if eta_max_ore is not None:
+            valide &= self.eta_ore[carburante] <= eta_max_ore
+        return np.flatnonzero(valide)
+
+    def ordina_per_prezzo(self, carburante):
+        righe = self.righe_con_prezzo(carburante)
+        return righe[np.argsort(self.prezzo[carburante][righe], kind="stable")]
+
+    def distanze_km(self, lat, lon):
+        phi1, phi2 = np.radians(lat), np.radians(self.lat)
+        d_phi, d_lambda = phi2 - phi1, np.radians(self.lon - lon)
+        a = np.sin(d_phi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(d_lambda / 2) ** 2
+        return 2 * RAGGIO_TERRA_KM * np.arcsin(np.sqrt(a))
+
+    def prezzo_effettivo(self, carburante, lat, lon):
+        """Prezzo al litro contando anche il carburante speso per andare e tornare dal distributore."""
+        litri_viaggio = 2 * self.distanze_km(lat, lon) * CONSUMO_LITRI_PER_KM
+        return self.prezzo[carburante] * (1 + litri_viaggio / LITRI_RIFORNIMENTO)
+
+    def ordina_per_convenienza(self, carburante, lat, lon):
+        righe = self.righe_con_prezzo(carburante)
+        return righe[np.argsort(self.prezzo_effettivo(carburante, lat, lon)[righe], kind="stable")]
+
+    def statistiche(self, carburante):
+        valori = self.prezzo.get(carburante, np.empty(0))
+        valori = valori[~np.isnan(valori)]
+        if not valori.size: return None
+        p25, mediana, p75 = np.percentile(valori, [25, 50, 75])
+        return {"minimo": float(valori.min()), "massimo": float(valori.max()), "media": float(valori.mean()),
+                "p25": float(p25), "mediana": float(mediana), "p75": float(p75), "numero": int(valori.size)}
@@ -0,0 +1,120 @@
+"""
+Importazione MIMIT su CSV di esempio (tests/dati), nei due formati dei file ufficiali.
+
+La parte di scrittura gira solo contro l'emulatore:
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python -m pytest tests/test_importa_mimit.py
+"""
+import os
+import sys
+import uuid
+
+import pytest
+
+pytest.importorskip("firebase_admin")
+pytest.importorskip("requests")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from client_firestore import connetti_firestore  # noqa: E402
+from importa_mimit import (StatoImportazione, associa_impianti, blocchi_di_scrittura,  # noqa: E402
+                           leggi_prezzi_mimit, righe_csv, scrivi_blocco)
+from indice_stazioni import IndiceStazioni  # noqa: E402
+
+DATI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dati")
+FORMATI = ["punto_e_virgola", "barra"]
+
+
+def _percorso(nome, formato):
+    return os.path.join(DATI, f"{nome}_{formato}.csv")
+
+
+@pytest.fixture
+def distributori():
+    # ID diversi a ogni esecuzione, così l'emulatore non conserva dati di prove precedenti
+    prefisso = f"test_{uuid.uuid4().hex[:8]}"
+    return {
+        "eni": {"id": f"{prefisso}_eni", "nome": "Eni Station Via Roma", "latitudine": "45.4642", "longitudine": "9.19"},
+        "vicino": {"id": f"{prefisso}_vicino", "nome": "Distributore Rossi", "latitudine": "45.47", "longitudine": "9.2"},
+        "lontano": {"id": f"{prefisso}_lontano", "nome": "IP Milano Nord", "latitudine": "45.48", "longitudine": "9.21"},
+    }
+
+
+@pytest.fixture
+def indice(tmp_path, distributori):
+    indice = IndiceStazioni(str(tmp_path / "indice.sqlite3"))
+    indice.aggiorna_stazioni(distributori.values())
+    return indice
+
+
+@pytest.mark.parametrize("formato", FORMATI)
+def test_righe_csv_salta_la_riga_di_estrazione(formato):
+    anagrafica = list(righe_csv(_percorso("anagrafica", formato)))
+    assert [r["idImpianto"] for r in anagrafica] == ["1001", "1002", "1003", "1004"]
+    assert anagrafica[0]["Bandiera"] == "Eni" and anagrafica[0]["Latitudine"] == "45.46474"
+    assert anagrafica[3]["Latitudine"] == ""
+    prezzi = list(righe_csv(_percorso("prezzi", formato)))
+    assert len(prezzi) == 8
+    assert prezzi[0] == {"idImpianto": "1001", "descCarburante": "Benzina", "prezzo": "1.999", "isSelf": "0", "dtComu": "18/10/2026 07:10:00"}
+
+
+@pytest.mark.parametrize("formato", FORMATI)
+def test_associa_impianti(formato, indice, distributori):
+    associazioni = associa_impianti(righe_csv(_percorso("anagrafica", formato)), indice)
+    # 1001: a 60 m con nome simile; 1002: a 25 m con nome diverso, vale solo la distanza
+    assert associazioni["1001"][0] == distributori["eni"]["id"]
+    assert associazioni["1002"][0] == distributori["vicino"]["id"]
+    # 1003: a 100 m con nome diverso; 1004: senza coordinate
+    assert set(associazioni) == {"1001", "1002"}
+
+
+def test_self_service_vince_sul_servito(indice, distributori):
+    associazioni = associa_impianti(righe_csv(_percorso("anagrafica", "punto_e_virgola")), indice)
+    prezzi = leggi_prezzi_mimit(righe_csv(_percorso("prezzi", "barra")), associazioni)
+    eni, vicino = distributori["eni"]["id"], distributori["vicino"]["id"]
+    # Il servito arriva prima del self per la benzina e dopo per il gasolio
+    assert prezzi[(eni, "Benzina")][0] == 1859
+    assert prezzi[(eni, "Gasolio")][0] == 1759
+    assert prezzi[(vicino, "GPL")][0] == 729
+    # Carburanti non gestiti e impianti non associati restano fuori
+    assert set(prezzi) == {(eni, "Benzina"), (eni, "Gasolio"), (vicino, "GPL")}
+    assert prezzi[(eni, "Benzina")][1].hour == 7
+
+
+def test_stato_importazione_restituisce_solo_i_cambiati(tmp_path):
+    stato = StatoImportazione(str(tmp_path / "stato.sqlite3"))
+    prima = {("a", "Benzina"): (1859, None), ("a", "Gasolio"): (1759, None)}
+    assert stato.cambiati(prima) == prima
+    stato.salva(prima)
+    dopo = {("a", "Benzina"): (1869, None), ("a", "Gasolio"): (1759, None), ("b", "GPL"): (729, None)}
+    assert stato.cambiati(dopo) == {("a", "Benzina"): (1869, None), ("b", "GPL"): (729, None)}
+
+
+@pytest.mark.skipif(not os.environ.get("FIRESTORE_EMULATOR_HOST"), reason="serve l'emulatore Firestore")
+def test_scrive_solo_i_prezzi_cambiati(tmp_path, indice, distributori):
+    db = connetti_firestore(str(tmp_path / "nessun_segreto.toml"))
+    stato = StatoImportazione(str(tmp_path / "stato.sqlite3"))
+    associazioni = associa_impianti(righe_csv(_percorso("anagrafica", "punto_e_virgola")), indice)
+    anagrafica = {place_id: (nome, lat, lon) for place_id, nome, lat, lon in associazioni.values()}
+
+    def importa(prezzi):
+        cambiati = stato.cambiati(prezzi)
+        for blocco in blocchi_di_scrittura(cambiati, anagrafica):
+            scrivi_blocco(db, blocco)
+        stato.salva(cambiati)
+        return cambiati
+
+    prezzi = leggi_prezzi_mimit(righe_csv(_percorso("prezzi", "punto_e_virgola")), associazioni)
+    assert len(importa(prezzi)) == 3
+    eni, vicino = distributori["eni"]["id"], distributori["vicino"]["id"]
+    documento = db.collection("prezzi_segnalati").document(eni).get().to_dict()
+    assert documento["prezzi"]["Benzina"]["valore"] == 1.859 and documento["geohash"]
+
+    # Un valore scritto a mano sul GPL: se il prezzo MIMIT non cambia non va sovrascritto
+    db.collection("prezzi_segnalati").document(vicino).update({"prezzi.GPL.valore": 0.111})
+    prezzi[(eni, "Benzina")] = (1869, prezzi[(eni, "Benzina")][1])
+    assert set(importa(prezzi)) == {(eni, "Benzina")}
+
+    documento = db.collection("prezzi_segnalati").document(eni).get().to_dict()
+    assert documento["prezzi"]["Benzina"]["valore"] == 1.869
+    assert documento["prezzi"]["Gasolio"]["valore"] == 1.759
+    assert db.collection("prezzi_segnalati").document(vicino).get().to_dict()["prezzi"]["GPL"]["valore"] == 0.111
@@ -0,0 +1,25 @@
+"""Codifica dei campioni dello storico: prezzo nei 20 bit bassi, secondi del mese in quelli alti."""
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("firebase_admin")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storico_prezzi import BIT_PREZZO, MASCHERA_PREZZO, codifica_campione, inizio_mese  # noqa: E402
+
+ISTANTE = 1792300000
+
+
+def test_codifica_tiene_separati_tempo_e_prezzo():
+    campione = codifica_campione(ISTANTE, 1.859)
+    assert campione & MASCHERA_PREZZO == 1859
+    assert campione >> BIT_PREZZO == ISTANTE - inizio_mese(ISTANTE)
+
+
+@pytest.mark.parametrize("prezzo", [1859, 1048.576, -0.5])
+def test_prezzo_fuori_scala(prezzo):
+    with pytest.raises(ValueError):
+        codifica_campione(ISTANTE, prezzo)
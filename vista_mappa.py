@@ -0,0 +1,47 @@
+"""
+Vista a mappa dei risultati.
+
+Porta con sé folium e streamlit_folium: app.py la importa solo quando
+l'utente sceglie la mappa.
+"""
+import time
+
+import streamlit as st
+from streamlit_folium import st_folium
+
+from mappa_distributori import aggiungi_distributori_sulla_mappa, crea_mappa_base, dimensione_dati, righe_marker, sostituisci_livello
+from metriche import misura_fase
+
+def get_mappa_risultati(risultati_finali, prezzi_community, user_location):
+    """
+    La mappa resta in sessione: si ricostruisce solo se cambiano i distributori
+    mostrati o la posizione; se cambiano solo i prezzi si sostituiscono i marker.
+    """
+    posizione = (user_location['latitude'], user_location['longitude']) if user_location else None
+    chiave_base = (tuple(d['id'] for d in risultati_finali), posizione)
+    documenti = tuple(prezzi_community.get(d['id']) for d in risultati_finali)
+    salvata = st.session_state.get("mappa_risultati")
+    if salvata and salvata["chiave_base"] == chiave_base and all(a is b for a, b in zip(salvata["documenti"], documenti)):
+        return salvata["mappa"]
+    inizio = time.perf_counter()
+    righe = righe_marker(risultati_finali, prezzi_community, user_location)
+    if salvata and salvata["chiave_base"] == chiave_base:
+        mappa = salvata["mappa"]
+        livello = sostituisci_livello(mappa, salvata["livello"], righe)
+        ricostruzione = "solo marker"
+    else:
+        mappa = crea_mappa_base(centro=[float(risultati_finali[0]['latitudine']), float(risultati_finali[0]['longitudine'])], zoom=12)
+        livello = aggiungi_distributori_sulla_mappa(mappa, righe)
+        ricostruzione = "completa"
+    st.session_state.mappa_risultati = {"chiave_base": chiave_base, "documenti": documenti, "mappa": mappa, "livello": livello}
+    st.session_state.statistiche_mappa = {
+        "ricostruzione": ricostruzione, "distributori": len(righe),
+        "tempo_ms": round((time.perf_counter() - inizio) * 1000, 2), "dati_marker_byte": dimensione_dati(righe),
+    }
+    return mappa
+
+def mostra_mappa(risultati_finali, prezzi_community, user_location):
+    # Comprende la serializzazione della mappa fatta da st_folium
+    with misura_fase("mappa"):
+        mappa_citta = get_mappa_risultati(risultati_finali, prezzi_community, user_location)
+        st_folium(mappa_citta, width="100%", height=500, returned_objects=[], key="mappa_folium")